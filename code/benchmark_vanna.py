@@ -0,0 +1,283 @@
+# code/benchmark_vanna.py
+# Offline end-to-end latency/throughput benchmark for the ask pipeline.
+#
+# Runs the same mixin stack as run_vanna_api.py, but with a deterministic stub LLM and stub embedder and an
+# in-memory Qdrant, so it needs no network: only a local Postgres holding the comments/locations tables.
+# The stub LLM answers with the SQL of the most similar trained example in its prompt, so retrieval,
+# prompt assembly and SQL execution all do real work.
+#
+# Usage (from the project root, DB_* settings are read from .env):
+#   python code/benchmark_vanna.py --requests 500 --concurrency 8
+#   python code/benchmark_vanna.py --mode baseline --stub-llm-latency-ms 800 --json-output bench.json
+#   python code/benchmark_vanna.py --load-data --data-dir data   # (re)load the CSVs first; use a scratch database
+#
+# `python code/faker_data.py --tenants 500 --comments 1000000` writes CSVs --load-data accepts, skewed like
+# production data so the benchmark's joins and GROUP BYs see realistic row distributions.
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from vanna.base import VannaBase
+from vanna.qdrant import Qdrant_VectorStore
+
+from rollups import refresh_comment_rollups
+from schema_setup import ensure_schema
+from vanna_cache import ResultCacheMixin, SemanticCacheMixin, TrainedQuestionIndexMixin
+from vanna_metrics import LatencyInstrumentationMixin, finish_trace, start_trace
+from vanna_postgres_pool import PostgresPoolMixin
+from vanna_training import BulkTrainingMixin
+from vanna_training_data import MANUAL_DDL, MANUAL_DOCUMENTATION, MANUAL_QUESTION_SQL
+
+EMBEDDING_DIMENSIONS = 384
+
+# Example questions from the README; the corpus adds generated variants of each
+README_QUESTIONS = [
+    "How many comments are there for each location?",
+    "What is the total number of comments for each tenant?",
+    "How many locations have more than 10 comments?",
+    "What is the average number of comments per location?",
+    "For each tenant, which location had the largest increase in comments between two consecutive months?",
+    "How many unique sentiment values are there and what are their counts?",
+    "What are the location IDs of locations that have more than 10 comments and were added after a specific date?",
+]
+VARIANT_PREFIXES = ["", "Please tell me: ", "Can you show me ", "Quick question - ", "I'd like to know "]
+VARIANT_SUFFIXES = ["", " please", " Thanks!", " (all time)"]
+
+# Stub LLM answer when the prompt carries no trained example
+FALLBACK_SQL = "SELECT COUNT(*) AS comment_count FROM comments"
+
+# CSVs loaded by --load-data, matching the upload scripts and faker_data.py output
+BENCHMARK_TABLES = [
+    ('locations', 'locations_exploded_final.csv'),
+    ('comments', 'comments.csv'),
+]
+
+
+class StubEmbeddingMixin:
+    """Deterministic hashed bag-of-words embeddings: similar wording gives similar vectors, no model download."""
+
+    def generate_embedding(self, data, **kwargs):
+        vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+        for token in re.findall(r"\w+", data.lower()):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % EMBEDDING_DIMENSIONS
+            vector[index] += 1.0 if digest[4] % 2 == 0 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def generate_embeddings(self, texts, batch_size=None):
+        return [self.generate_embedding(text) for text in texts]
+
+
+class StubChat(VannaBase):
+    """LLM stand-in that answers with the SQL of the first (most similar) example in the prompt."""
+
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+        self.stub_llm_latency = float((config or {}).get('stub_llm_latency_ms', 0)) / 1000.0
+
+    def system_message(self, message):
+        return {"role": "system", "content": message}
+
+    def user_message(self, message):
+        return {"role": "user", "content": message}
+
+    def assistant_message(self, message):
+        return {"role": "assistant", "content": message}
+
+    def submit_prompt(self, prompt, **kwargs):
+        if self.stub_llm_latency:
+            time.sleep(self.stub_llm_latency)
+        for message in prompt:
+            if message["role"] == "assistant":
+                return message["content"]
+        return FALLBACK_SQL
+
+    def log(self, message, title="Info"):
+        # VannaBase prints every prompt and response; far too noisy for thousands of requests
+        pass
+
+
+def _init_benchmark_vanna(vn, config):
+    Qdrant_VectorStore.__init__(vn, config={
+        'client': config['client'],
+        'documentation_collection_name': "vanna_documentation",
+        'ddl_collection_name': "vanna_ddl",
+        'sql_collection_name': "vanna_sql",
+    })
+    StubChat.__init__(vn, config=config)
+
+
+class BenchmarkVanna(LatencyInstrumentationMixin, TrainedQuestionIndexMixin, SemanticCacheMixin, ResultCacheMixin,
+                     PostgresPoolMixin, StubEmbeddingMixin, BulkTrainingMixin, Qdrant_VectorStore, StubChat):
+    # Same fast paths as run_vanna_api.py's MyVanna
+    def __init__(self, config=None):
+        _init_benchmark_vanna(self, config)
+
+
+class BaselineBenchmarkVanna(LatencyInstrumentationMixin, PostgresPoolMixin, StubEmbeddingMixin, BulkTrainingMixin,
+                             Qdrant_VectorStore, StubChat):
+    # Every request goes through retrieval, the LLM and Postgres
+    def __init__(self, config=None):
+        _init_benchmark_vanna(self, config)
+
+
+def build_corpus(variants_per_question, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for question in README_QUESTIONS:
+        corpus.append(question)
+        for _ in range(variants_per_question):
+            variant = rng.choice(VARIANT_PREFIXES) + question + rng.choice(VARIANT_SUFFIXES)
+            if rng.random() < 0.5:
+                variant = variant.lower()
+            if rng.random() < 0.3:
+                variant = variant.replace("?", "")
+            corpus.append(variant)
+    return corpus
+
+
+def load_data(connection_params, data_dir):
+    # Create the benchmark tables if needed and replace their contents with the CSVs in data_dir
+    conn = psycopg2.connect(**connection_params)
+    try:
+        with conn.cursor() as cur:
+            # Same tables and indexes as production, so the benchmark sees the same query plans
+            ensure_schema(cur)
+        conn.commit()
+        with conn.cursor() as cur:
+            for table, filename in BENCHMARK_TABLES:
+                path = os.path.join(data_dir, filename)
+                cur.execute(f"TRUNCATE {table}")
+                with open(path, 'r', encoding='utf-8') as f:
+                    cur.copy_expert(f"COPY {table} FROM STDIN WITH CSV HEADER", f)
+                print(f"Loaded {path} into {table} ({cur.rowcount} rows).")
+            # The trained SQL answers count and sentiment questions from the rollups
+            refresh_comment_rollups(cur)
+            cur.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_benchmark(vn, corpus, requests, concurrency, seed):
+    rng = random.Random(seed)
+    schedule = [rng.choice(corpus) for _ in range(requests)]
+    errors = []
+
+    def one_request(question):
+        start_trace()
+        started = time.perf_counter()
+        try:
+            sql = vn.generate_sql(question=question, allow_llm_to_see_data=True)
+            vn.run_sql(sql)
+        except Exception as e:
+            errors.append(f"{question}: {e}")
+        finally:
+            vn.latency_metrics.observe('request_total', time.perf_counter() - started)
+            finish_trace()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_request, schedule))
+    return time.perf_counter() - started, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for the Vanna ask pipeline.")
+    parser.add_argument('--mode', choices=['full', 'baseline'], default='full',
+                        help="'full' uses the API's caches and fast paths, 'baseline' sends every request to the LLM.")
+    parser.add_argument('--requests', type=int, default=200, help="Total number of questions to replay.")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent requests.")
+    parser.add_argument('--variants', type=int, default=5, help="Generated variants per example question.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stub-llm-latency-ms', type=float, default=0.0,
+                        help="Simulated LLM completion time, to model the cost the fast paths avoid.")
+    parser.add_argument('--pool-max-size', type=int, default=10)
+    parser.add_argument('--load-data', action='store_true',
+                        help="Create the comments/locations tables if needed and (re)load them from --data-dir.")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--json-output', help="Write the summary as JSON to this path.")
+    parser.add_argument('--fail-above-p95-ms', type=float,
+                        help="Exit with status 1 if the request_total p95 exceeds this, for regression gating.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    connection_params = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'dbname': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'port': os.getenv('DB_PORT', '5432'),
+    }
+
+    if args.load_data:
+        load_data(connection_params, args.data_dir)
+
+    vanna_class = BenchmarkVanna if args.mode == 'full' else BaselineBenchmarkVanna
+    vn = vanna_class(config={
+        'client': QdrantClient(":memory:"),
+        'stub_llm_latency_ms': args.stub_llm_latency_ms,
+    })
+    vn.train_bulk(ddl=MANUAL_DDL, documentation=MANUAL_DOCUMENTATION, question_sql=MANUAL_QUESTION_SQL,
+                  incremental=False)
+
+    vn.connect_to_postgres_pool(**connection_params, max_size=args.pool_max_size)
+    if args.mode == 'full':
+        vn.rebuild_question_index()
+        vn.enable_result_cache()
+    vn.instrument_run_sql()
+    # Training embeddings are not part of the benchmark
+    vn.latency_metrics.reset()
+
+    corpus = build_corpus(args.variants, args.seed)
+    print(f"Replaying {args.requests} requests from a corpus of {len(corpus)} questions "
+          f"at concurrency {args.concurrency} (mode: {args.mode})...")
+    elapsed, errors = run_benchmark(vn, corpus, args.requests, args.concurrency, args.seed)
+
+    stages = vn.latency_metrics.summary()
+    for counts in stages.values():
+        counts['per_second'] = round(counts['count'] / elapsed, 2) if elapsed > 0 else 0.0
+    summary = {
+        'mode': args.mode,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(args.requests / elapsed, 2) if elapsed > 0 else 0.0,
+        'errors': len(errors),
+        'stages': stages,
+    }
+
+    print(f"\n{'stage':<30}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>10}")
+    for stage, counts in stages.items():
+        print(f"{stage:<30}{counts['count']:>8}{counts['p50_ms']:>10}{counts['p95_ms']:>10}"
+              f"{counts['p99_ms']:>10}{counts['per_second']:>10}")
+    print(f"\n{summary['requests_per_second']} requests/s over {summary['elapsed_seconds']}s, "
+          f"{len(errors)} errors.")
+    for error in errors[:5]:
+        print(f"Error: {error}")
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.json_output}")
+
+    if args.fail_above_p95_ms is not None:
+        p95 = stages.get('request_total', {}).get('p95_ms')
+        if p95 is None or p95 > args.fail_above_p95_ms:
+            print(f"request_total p95 {p95} ms exceeds {args.fail_above_p95_ms} ms.")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# code/data_version.py
+# Data-version tokens for the tables loaded by the upload scripts.
+#
+# Every load bumps the version of the table it wrote, in the same transaction as the COPY, so readers
+# such as the API's result cache can tell when cached query results are stale.
+DATA_VERSION_TABLE = "data_versions"
+
+CREATE_DATA_VERSION_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+        table_name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+BUMP_DATA_VERSION_SQL = f"""
+    INSERT INTO {DATA_VERSION_TABLE} (table_name, version, updated_at)
+    VALUES (%s, 1, now())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = {DATA_VERSION_TABLE}.version + 1, updated_at = now()
+"""
+
+# Whether the version table exists yet; the API only reads, so it must not fail before the first load
+DATA_VERSION_TABLE_EXISTS_SQL = f"SELECT to_regclass('{DATA_VERSION_TABLE}') IS NOT NULL AS present"
+
+# One string covering every table, e.g. "comments:3,locations:1"
+DATA_VERSION_TOKEN_SQL = f"""
+    SELECT COALESCE(string_agg(table_name || ':' || version, ',' ORDER BY table_name), '') AS token
+    FROM {DATA_VERSION_TABLE}
+"""
+
+
+def ensure_data_version_table(cur):
+    # Loaders running in parallel should call this once up front: concurrent CREATE TABLE IF NOT EXISTS can fail
+    cur.execute(CREATE_DATA_VERSION_TABLE_SQL)
+
+
+def bump_data_version(cur, table_name):
+    # Call before conn.commit() so the new version becomes visible together with the loaded rows
+    ensure_data_version_table(cur)
+    cur.execute(BUMP_DATA_VERSION_SQL, (table_name,))
+
+
+def get_data_version_token(run_sql):
+    """
+    Return the current data-version token using a Vanna-style `run_sql(sql) -> DataFrame` callable.
+
+    Returns '' when no load has recorded a version yet.
+    """
+    if not run_sql(DATA_VERSION_TABLE_EXISTS_SQL)['present'].iloc[0]:
+        return ''
+    return run_sql(DATA_VERSION_TOKEN_SQL)['token'].iloc[0]
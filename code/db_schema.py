@@ -0,0 +1,64 @@
+# code/db_schema.py
+# Column layout of the tables loaded into Postgres, in DDL order (see the locations/comments DDL in
+# vanna_training_data.py). CSVs are loaded with positional COPY, so files must use exactly this order.
+LOCATIONS_TABLE = 'locations'
+LOCATIONS_COLUMNS = [
+    'name', 'tenant_id', 'location_id', 'location_type', 'emails', 'industry', 'updated_date',
+    'country', 'street_address', 'timezone', 'postal_code', 'locality', 'street_address2', 'region',
+]
+# Address fields exploded out of the raw `address` JSON column of a BigQuery locations export
+LOCATION_ADDRESS_COLUMNS = [
+    'country', 'street_address', 'timezone', 'postal_code', 'locality', 'street_address2', 'region',
+]
+
+COMMENTS_TABLE = 'comments'
+COMMENTS_COLUMNS = [
+    'tenant_id', 'entity_id', 'comment_id', 'text', 'created_date', 'location_updated_date',
+    'overall_sentiment_score', 'text_language', 'removed',
+]
+
+# Loadable tables and their COPY column order
+TABLE_COLUMNS = {
+    LOCATIONS_TABLE: LOCATIONS_COLUMNS,
+    COMMENTS_TABLE: COMMENTS_COLUMNS,
+}
+
+# Primary key of each loadable table, used to merge reloads
+TABLE_PRIMARY_KEYS = {
+    LOCATIONS_TABLE: 'location_id',
+    COMMENTS_TABLE: 'comment_id',
+}
+
+# Postgres type of every non-TEXT column, for typed (binary COPY) ingestion; other columns are TEXT
+LOCATIONS_COLUMN_TYPES = {'tenant_id': 'int4', 'updated_date': 'timestamp'}
+COMMENTS_COLUMN_TYPES = {
+    'tenant_id': 'int4',
+    'created_date': 'timestamp',
+    'location_updated_date': 'timestamp',
+    'overall_sentiment_score': 'float8',
+    'removed': 'bool',
+}
+TABLE_COLUMN_TYPES = {
+    LOCATIONS_TABLE: {column: LOCATIONS_COLUMN_TYPES.get(column, 'text') for column in LOCATIONS_COLUMNS},
+    COMMENTS_TABLE: {column: COMMENTS_COLUMN_TYPES.get(column, 'text') for column in COMMENTS_COLUMNS},
+}
+
+# Secondary indexes, created by schema_setup.py and trained into Vanna with the table DDL. They follow the
+# generated queries: joins on comments.entity_id (with created_date for per-location date filters and rollup
+# refreshes), tenant filters, and a BRIN index for created_date ranges. BRIN only prunes when rows are stored
+# roughly in created_date order: exports are appended day by day, and faker_data.py writes comments in
+# created_date order for the same reason.
+COMMENTS_ENTITY_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS comments_entity_id_created_date_idx ON comments (entity_id, created_date);"
+)
+COMMENTS_TENANT_INDEX_DDL = "CREATE INDEX IF NOT EXISTS comments_tenant_id_idx ON comments (tenant_id);"
+COMMENTS_CREATED_DATE_BRIN_DDL = (
+    "CREATE INDEX IF NOT EXISTS comments_created_date_brin ON comments USING brin (created_date);"
+)
+LOCATIONS_TENANT_INDEX_DDL = "CREATE INDEX IF NOT EXISTS locations_tenant_id_idx ON locations (tenant_id);"
+INDEX_DDL = [
+    COMMENTS_ENTITY_INDEX_DDL,
+    COMMENTS_TENANT_INDEX_DDL,
+    COMMENTS_CREATED_DATE_BRIN_DDL,
+    LOCATIONS_TENANT_INDEX_DDL,
+]
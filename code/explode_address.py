@@ -1,50 +1,296 @@
-import pandas as pd
-import json
+# code/explode_address.py
+# Explode the `address` JSON column of a BigQuery locations export into the columns of the `locations` table.
+#
+# Single streaming pass: the CSV is read in chunks, each address is parsed with a fast JSON parser (orjson when
+# installed) and only falls back to ast.literal_eval for Python-style dicts. Nested address objects, including
+# dicts encoded as strings inside the JSON, are flattened, and the output columns are built directly from the
+# parsed dicts in the exact column order of the `locations` table (db_schema.LOCATIONS_COLUMNS), ready for the
+# upload scripts.
+#
+# Address parsing is pure Python, so with --workers N (default: all cores) chunks are parsed by a process pool
+# while the main process reads ahead and writes the results in input order. Rows whose address cannot be
+# parsed keep empty address columns; they are also written to a reject file with the reason, and summarized
+# by reason at the end.
+#
+# Memory is bounded by the chunk size (--chunk-size rows), not the file size. --max-memory-mb sets a ceiling
+# instead: the rows per chunk are derived from the in-memory size of a sample of the input and the number of
+# chunks alive at once (read ahead, in the workers, being written). --chunk-size 0 reads the whole file as one
+# chunk; every chunk size produces byte-identical output.
+#
+# With --format parquet the output is a typed, compressed Parquet file (parquet_io.py) that postgres_loader.py
+# loads without parsing text; a .parquet input is read a row group batch at a time, only the needed columns.
+#
+# Usage (from the project root):
+#   python code/explode_address.py
+#   python code/explode_address.py --input data/locations.csv --output data/locations_exploded_final.csv
+#   python code/explode_address.py --workers 8 --reject-file data/locations_rejects.csv
+#   python code/explode_address.py --max-memory-mb 2048
+#   python code/explode_address.py --format parquet --output data/locations_exploded_final.parquet
+import argparse
 import ast
+import json
+import os
 import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
 
-# Path to your CSV file
-csv_path = 'data/locations.csv'
+from db_schema import LOCATION_ADDRESS_COLUMNS, LOCATIONS_COLUMNS, LOCATIONS_TABLE, TABLE_COLUMN_TYPES
+from parquet_io import (ParquetChunkWriter, check_parquet_columns, is_parquet_path, iter_parquet_frames,
+                        read_parquet_frame)
 
-# Read the CSV, making sure not to parse the address column as dict
-df = pd.read_csv(csv_path, dtype={'address': str}, quoting=1, engine='python')
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library parser is slower but equivalent
+    orjson = None
 
-def clean_address(addr):
-    if pd.isnull(addr):
-        return None
-    # Remove leading/trailing whitespace and newlines
-    addr = addr.strip()
-    # Remove newlines and excessive spaces inside the JSON
-    addr = re.sub(r'\s+', ' ', addr)
-    return addr
+DEFAULT_INPUT_PATH = 'data/locations.csv'
+DEFAULT_OUTPUT_PATH = 'data/locations_exploded_final.csv'
+DEFAULT_REJECT_PATH = 'data/locations_rejects.csv'
+DEFAULT_CHUNK_SIZE = 100000
+OUTPUT_FORMATS = ('csv', 'parquet')
+# Chunks in flight per worker: enough to keep workers busy while bounding memory
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+# Rows sampled to estimate the in-memory size of a row for --max-memory-mb
+MEMORY_SAMPLE_ROWS = 10000
+# Copies of a chunk alive while it is processed: the input frame, the addresses sent to the parser, the
+# parsed address columns and the exploded frame with its encoded output
+CHUNK_MEMORY_FACTOR = 4
 
-# Function to parse the JSON string in the 'address' column
-def parse_address(addr):
+# Columns taken as-is from the export; the address columns come from the parsed `address` JSON
+BASE_COLUMNS = [column for column in LOCATIONS_COLUMNS if column not in LOCATION_ADDRESS_COLUMNS]
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+_whitespace = re.compile(r'\s+')
+
+
+def _load_dict(text):
+    # Newlines and runs of whitespace are collapsed first, as the exports contain raw line breaks inside the
+    # JSON strings. Then JSON; Python-style dicts ("{'country': 'US'}") only when JSON fails.
+    text = _whitespace.sub(' ', text.strip())
     try:
-        if pd.isnull(addr):
-            return {}
-        addr = clean_address(addr)
-        # Try JSON first
+        value = _json_loads(text)
+    except ValueError:
         try:
-            return json.loads(addr)
-        except Exception:
-            # Try literal_eval for Python-style dicts
-            return ast.literal_eval(addr)
-    except Exception as e:
-        print(f"Error parsing address: {addr}\n{e}")
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            raise ValueError("neither JSON nor a Python literal") from None
+    if not isinstance(value, dict):
+        raise ValueError(f"address is a {type(value).__name__}, not an object")
+    return value
+
+
+def _flatten(value, flat):
+    # Nested objects (and objects encoded as strings) contribute their keys; outer keys win
+    for key, item in value.items():
+        if isinstance(item, str) and item.lstrip().startswith('{'):
+            try:
+                item = _load_dict(item)
+            except ValueError:
+                pass
+        if isinstance(item, dict):
+            _flatten(item, flat)
+        elif key not in flat:
+            flat[key] = item
+    return flat
+
+
+def parse_address(raw):
+    """Return the flattened address dict of one raw `address` value ({} when empty); ValueError when malformed."""
+    if raw is None or (isinstance(raw, float) and pd.isna(raw)) or not str(raw).strip():
         return {}
+    return _flatten(_load_dict(raw), {})
+
+
+def parse_addresses(raws):
+    """
+    Parse a list of raw addresses; returns ({address column: values}, [(position, reason)] of malformed ones).
+
+    Runs in the worker processes, so it only takes and returns plain lists.
+    """
+    columns = {column: [] for column in LOCATION_ADDRESS_COLUMNS}
+    rejects = []
+    for position, raw in enumerate(raws):
+        try:
+            address = parse_address(raw)
+        except ValueError as e:
+            rejects.append((position, str(e)))
+            address = {}
+        for column in LOCATION_ADDRESS_COLUMNS:
+            columns[column].append(address.get(column))
+    return columns, rejects
+
+
+def assemble_chunk(chunk, address_columns, rejects):
+    """
+    Combine a chunk of the export with its parsed address columns.
+
+    Returns (DataFrame with LOCATIONS_COLUMNS, DataFrame of the rejected input rows with a `reject_reason`).
+    """
+    exploded = {column: chunk[column].to_numpy() for column in BASE_COLUMNS}
+    # Object columns keep parsed values as they are: inferring a dtype per chunk would turn a numeric postal code
+    # into 12345.0 in chunks that also hold a missing one, so the output would depend on the chunk size
+    exploded.update((column, pd.Series(values, dtype=object)) for column, values in address_columns.items())
+    rejected = chunk.iloc[[position for position, _ in rejects]].copy()
+    rejected['reject_reason'] = [reason for _, reason in rejects]
+    return pd.DataFrame(exploded, columns=LOCATIONS_COLUMNS), rejected
+
+
+def read_export_chunks(input_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    # chunk_size None (or 0) reads the whole file as a single chunk
+    if is_parquet_path(input_path):
+        check_parquet_columns(input_path, BASE_COLUMNS + ['address'])
+        if not chunk_size:
+            yield read_parquet_frame(input_path, BASE_COLUMNS + ['address'])
+        else:
+            yield from iter_parquet_frames(input_path, BASE_COLUMNS + ['address'], chunk_size)
+        return
+    # Every field as a string, so ids and postal codes keep their leading zeros
+    chunks = pd.read_csv(input_path, dtype=str, keep_default_na=False, na_values=[''], chunksize=chunk_size or None)
+    for chunk in ([chunks] if not chunk_size else chunks):
+        missing = [column for column in BASE_COLUMNS + ['address'] if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"{input_path} is missing columns: {', '.join(missing)}")
+        yield chunk
+
+
+def chunk_size_for_memory(input_path, max_memory_mb, workers=1, sample_rows=MEMORY_SAMPLE_ROWS):
+    """
+    Rows per chunk that keep the chunks alive at once within `max_memory_mb`.
+
+    The size of a row is estimated from the first `sample_rows` rows of the input; interpreter and library
+    overhead of each process is not included. Raises ValueError when not even one row fits.
+    """
+    sample = next(read_export_chunks(input_path, sample_rows), None)
+    if sample is None or not len(sample):
+        return DEFAULT_CHUNK_SIZE
+    row_bytes = sample.memory_usage(index=False, deep=True).sum() / len(sample)
+    chunks_alive = 1 + (workers * CHUNKS_IN_FLIGHT_PER_WORKER if workers > 1 else 0)
+    rows = int(max_memory_mb * 1024 * 1024 / (row_bytes * CHUNK_MEMORY_FACTOR * chunks_alive))
+    if rows < 1:
+        raise ValueError(f"--max-memory-mb {max_memory_mb} is too small for {chunks_alive} chunks of rows of "
+                         f"about {row_bytes:.0f} bytes; raise it or use fewer workers.")
+    return rows
+
+
+def _parsed_chunks(chunks, workers):
+    # Yield (chunk, address_columns, rejects) in input order, parsing in a process pool when workers > 1
+    if workers <= 1:
+        for chunk in chunks:
+            yield (chunk,) + parse_addresses(chunk['address'].tolist())
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append((chunk, executor.submit(parse_addresses, chunk['address'].tolist())))
+            if len(in_flight) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                chunk, future = in_flight.popleft()
+                yield (chunk,) + future.result()
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            yield (chunk,) + future.result()
+
+
+class _CsvOutput:
+    # Header with the first chunk, then append
+    def __init__(self, output_path):
+        self._file = open(output_path, 'w', newline='', encoding='utf-8')
+        self._header = True
+
+    def write(self, exploded):
+        exploded.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+def _parquet_output(output_path):
+    # Typed like the locations table, so the loader sends it as binary COPY without parsing text
+    return ParquetChunkWriter(output_path, TABLE_COLUMN_TYPES[LOCATIONS_TABLE])
+
+
+OUTPUTS = {'csv': _CsvOutput, 'parquet': _parquet_output}
+
+
+def explode_file(input_path=DEFAULT_INPUT_PATH, output_path=DEFAULT_OUTPUT_PATH, chunk_size=DEFAULT_CHUNK_SIZE,
+                 workers=1, reject_path=DEFAULT_REJECT_PATH, output_format='csv'):
+    """
+    Explode `input_path` into `output_path` chunk by chunk, parsing addresses in `workers` processes.
+
+    `chunk_size` rows are held per chunk (None or 0: the whole file at once); the output does not depend on
+    it. `output_format` is 'csv' or 'parquet'; a .parquet input is read as Parquet. Rejected rows go to
+    `reject_path` as CSV (created only when there are any). Returns (rows written, Counter of reject reasons).
+    """
+    if output_format not in OUTPUTS:
+        raise ValueError(f"Unknown output format {output_format!r}; expected one of {OUTPUT_FORMATS}.")
+    rows = 0
+    reject_reasons = Counter()
+    reject_file = None
+    # A reject file left by an earlier run would otherwise look like this run's rejects
+    if os.path.exists(reject_path):
+        os.remove(reject_path)
+    # Both files default to data/, which need not exist relative to the working directory
+    for path in (output_path, reject_path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    output = OUTPUTS[output_format](output_path)
+    try:
+        parsed = _parsed_chunks(read_export_chunks(input_path, chunk_size), workers)
+        for chunk, address_columns, rejects in parsed:
+            exploded, rejected = assemble_chunk(chunk, address_columns, rejects)
+            output.write(exploded)
+            rows += len(exploded)
+            if len(rejected):
+                if reject_file is None:
+                    reject_file = open(reject_path, 'w', newline='', encoding='utf-8')
+                    rejected.to_csv(reject_file, header=True, index=False)
+                else:
+                    rejected.to_csv(reject_file, header=False, index=False)
+                reject_reasons.update(rejected['reject_reason'])
+    finally:
+        output.close()
+        if reject_file is not None:
+            reject_file.close()
+    return rows, reject_reasons
 
-# Debug print for raw address values
-for i, addr in enumerate(df['address']):
-    print(f"Row {i}: {addr}")
 
-# Parse the address column
-address_df = df['address'].apply(parse_address).apply(pd.Series)
+def main():
+    parser = argparse.ArgumentParser(description="Explode the address JSON of a locations export into columns.")
+    parser.add_argument('--input', default=DEFAULT_INPUT_PATH,
+                        help="Locations CSV (or .parquet) with an `address` JSON column.")
+    parser.add_argument('--output', default=None,
+                        help="Output in the column layout of the locations table (default: "
+                             f"{DEFAULT_OUTPUT_PATH}, or .parquet with --format parquet).")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help="Output format; parquet is typed and compressed, for postgres_loader.py.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows read and written at a time; 0 reads the whole file at once.")
+    parser.add_argument('--max-memory-mb', type=float, default=None,
+                        help="Memory ceiling for the chunks being processed; lowers the chunk size to fit.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Processes parsing addresses in parallel; 1 parses in the main process.")
+    parser.add_argument('--reject-file', default=DEFAULT_REJECT_PATH,
+                        help="CSV receiving rows with a malformed address, plus a reject_reason column.")
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = os.path.splitext(DEFAULT_OUTPUT_PATH)[0] + '.parquet' if args.format == 'parquet' \
+            else DEFAULT_OUTPUT_PATH
+    chunk_size = args.chunk_size
+    if args.max_memory_mb is not None:
+        memory_chunk_size = chunk_size_for_memory(args.input, args.max_memory_mb, workers=args.workers)
+        chunk_size = min(chunk_size, memory_chunk_size) if chunk_size else memory_chunk_size
+        print(f"Using chunks of {chunk_size} rows to stay within {args.max_memory_mb:g} MB.")
 
-# Combine the new address columns with the original DataFrame (excluding the original address column)
-df_exploded = pd.concat([df.drop(columns=['address']), address_df], axis=1)
+    rows, reject_reasons = explode_file(args.input, args.output, chunk_size, workers=args.workers,
+                                        reject_path=args.reject_file, output_format=args.format)
+    rejected = sum(reject_reasons.values())
+    print(f"Exploded locations saved to {args.output} ({rows} rows, {rejected} malformed addresses left empty)")
+    if rejected:
+        print(f"Rejected rows written to {args.reject_file}:")
+        for reason, count in reject_reasons.most_common():
+            print(f"  {count:>10}  {reason}")
 
-# Save the result
-df_exploded.to_csv('data/locations_exploded.csv', index=False)
 
-print("Exploded CSV saved to data/locations_exploded.csv") 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
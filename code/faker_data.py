@@ -1,93 +1,423 @@
-import csv
+# code/faker_data.py
+# Generate synthetic locations and comments for load testing, in the exact column layout of the `locations`
+# and `comments` tables (see db_schema.py), so the upload scripts load the output directly.
+#
+# Faker is only used to build fixed pools of comment texts, company names, emails and addresses up front;
+# every row is then assembled with NumPy by sampling from those pools, so generation cost per row is tiny and
+# independent of Faker. Rows are produced and written in chunks, so memory stays flat no matter how many
+# comments are requested, and the same seed (and end date) always produces the same files.
+#
+# The data is skewed like production: locations per tenant and comments per location follow Pareto
+# distributions, so a few tenants are huge and most locations only get a handful of comments.
+#
+# With --shards N the tenant range is split into N shards generated by a process pool. Each shard is written
+# to its own files with a deterministic per-shard seed and globally unique location and comment ids, so
+# generation scales with cores and the shards can be loaded in parallel.
+#
+# With --to-postgres nothing is written to disk: each shard streams its rows straight into the existing
+# `locations` and `comments` tables through COPY (postgres_copy.py), so generation and loading overlap.
+# Every shard loads in its own connection and transaction, using the DB_* settings from .env. Rows are sent in
+# COPY's binary format by default, since the generated frames already carry proper types.
+#
+# Usage (from the project root):
+#   python code/faker_data.py                                   # 20 tenants, 1,000 comments
+#   python code/faker_data.py --tenants 5000 --comments 20000000 --chunk-size 500000 --seed 7
+#   python code/faker_data.py --tenants 50000 --comments 50000000 --shards 32 --workers 8 --format parquet
+#   python code/faker_data.py --tenants 5000 --comments 20000000 --shards 8 --to-postgres
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
 from faker import Faker
-import random
-from datetime import datetime, timedelta
-
-# Initialize Faker
-fake = Faker()
-
-# Define the number of tenants and reviews
-num_tenants = 20
-reviews_per_tenant = 1000 // num_tenants # Ensure 1000 reviews total
-total_reviews = num_tenants * reviews_per_tenant # Total reviews will be 1000
-
-# Generate tenant and location IDs
-# Each tenant will have between 1 and 5 locations
-tenant_locations = {}
-location_counter = 1
-for i in range(1, num_tenants + 1):
-    tenant_id = i
-    num_locations = random.randint(1, 5)
-    locations = [location_counter + j for j in range(num_locations)]
-    tenant_locations[tenant_id] = locations
-    location_counter += num_locations
-
-# Prepare data for CSV
-data = []
-comment_id_counter = 1
-
-# Generate reviews for each tenant
-for tenant_id in range(1, num_tenants + 1):
-    locations_for_tenant = tenant_locations[tenant_id]
-    for _ in range(reviews_per_tenant):
-        comment_id = comment_id_counter
-        comment_id_counter += 1
-
-        # Randomly pick a location for this tenant
-        location_id = random.choice(locations_for_tenant)
-
-        # Generate comment text with some sentiment variation
-        sentiment_type = random.choice(['positive', 'negative', 'neutral'])
-        if sentiment_type == 'positive':
-            comment = random.choice([
-                fake.sentence() + " Great experience!",
-                fake.paragraph() + " Highly recommend.",
-                "Fantastic service! " + fake.text(max_nb_chars=80),
-                "Loved it! " + fake.sentence(nb_words=10),
-                fake.sentence() + " Will definitely come back."
-            ])
-        elif sentiment_type == 'negative':
-             comment = random.choice([
-                fake.sentence() + " Very disappointing.",
-                fake.paragraph() + " Would not recommend.",
-                "Terrible experience. " + fake.text(max_nb_chars=80),
-                "Didn't like it. " + fake.sentence(nb_words=10),
-                fake.sentence() + " Won't be returning."
-            ])
-        else: # neutral
-             comment = random.choice([
-                fake.sentence(),
-                fake.paragraph(),
-                fake.text(max_nb_chars=100),
-                fake.sentence(nb_words=15),
-            ])
-
-        # Generate a recent created date
-        created_date = fake.date_time_between(start_date='-1y', end_date='now')
-
-        data.append([comment_id, tenant_id, location_id, comment, created_date.strftime('%Y-%m-%d %H:%M:%S')])
-
-# Define the absolute output directory path provided by the user
-output_dir = '/Users/crees/PycharmProjects/dsproject_vanna_postgres/data' # Use the absolute path
-
-# Define the output filename
-output_filename = 'reviews.csv'
-
-# Combine the directory and filename to get the full output path
-output_filepath = os.path.join(output_dir, output_filename)
-
-# Ensure the data directory exists
-os.makedirs(output_dir, exist_ok=True)
-
-# Write data to CSV
-with open(output_filepath, 'w', newline='', encoding='utf-8') as csvfile:
-    csv_writer = csv.writer(csvfile)
-
-    # Write header
-    csv_writer.writerow(['comment_id', 'tenant_id', 'location_id', 'comment', 'created_date'])
-
-    # Write data rows
-    csv_writer.writerows(data)
-
-print(f"Successfully generated {total_reviews} reviews and saved to {output_filepath}")
+
+from data_version import bump_data_version, ensure_data_version_table
+from db_schema import COMMENTS_COLUMNS, COMMENTS_TABLE, LOCATIONS_COLUMNS, LOCATIONS_TABLE, TABLE_COLUMN_TYPES
+from parquet_io import pq, write_parquet_chunks
+from postgres_copy import connect_from_env, copy_chunks
+from rollups import ensure_rollups, refresh_comment_rollups
+
+DEFAULT_OUTPUT_DIR = 'data'
+# Same file names the upload scripts read
+LOCATIONS_FILENAME = 'locations_exploded_final.csv'
+COMMENTS_FILENAME = 'comments.csv'
+# Distinct comment texts generated with Faker and sampled for every row
+DEFAULT_TEXT_POOL_SIZE = 5000
+# Distinct company names, emails and address parts sampled for every location
+DEFAULT_LOCATION_POOL_SIZE = 2000
+DEFAULT_CHUNK_SIZE = 100000
+# Pareto shapes of locations per tenant and comments per location; smaller means more skew
+DEFAULT_LOCATION_SKEW = 1.2
+DEFAULT_COMMENT_SKEW = 1.1
+# Comments and location updates are spread over this many days before the end date
+CREATED_DATE_RANGE_DAYS = 365
+
+LOCATION_TYPES = np.array(['store', 'restaurant', 'clinic', 'office', 'hotel', 'dealership'], dtype=object)
+INDUSTRIES = np.array(['retail', 'hospitality', 'healthcare', 'automotive', 'financial services', 'real estate'],
+                      dtype=object)
+TEXT_LANGUAGES = np.array(['en', 'es', 'fr', 'de'], dtype=object)
+TEXT_LANGUAGE_WEIGHTS = [0.85, 0.08, 0.04, 0.03]
+# Share of comments flagged as removed and of locations with a second address line
+REMOVED_RATE = 0.02
+STREET_ADDRESS2_RATE = 0.3
+# Comment columns drawn from their own random stream each, so a column's values do not depend on how the
+# comments are split into chunks
+COMMENT_STREAMS = ('location', 'text', 'created_date', 'sentiment', 'language', 'removed')
+
+# Comment templates with some sentiment variation
+POSITIVE_TEMPLATES = [
+    lambda fake: fake.sentence() + " Great experience!",
+    lambda fake: fake.paragraph() + " Highly recommend.",
+    lambda fake: "Fantastic service! " + fake.text(max_nb_chars=80),
+    lambda fake: "Loved it! " + fake.sentence(nb_words=10),
+    lambda fake: fake.sentence() + " Will definitely come back.",
+]
+NEGATIVE_TEMPLATES = [
+    lambda fake: fake.sentence() + " Very disappointing.",
+    lambda fake: fake.paragraph() + " Would not recommend.",
+    lambda fake: "Terrible experience. " + fake.text(max_nb_chars=80),
+    lambda fake: "Didn't like it. " + fake.sentence(nb_words=10),
+    lambda fake: fake.sentence() + " Won't be returning.",
+]
+NEUTRAL_TEMPLATES = [
+    lambda fake: fake.sentence(),
+    lambda fake: fake.paragraph(),
+    lambda fake: fake.text(max_nb_chars=100),
+    lambda fake: fake.sentence(nb_words=15),
+]
+# Template group and the overall_sentiment_score range of its comments
+SENTIMENT_GROUPS = [
+    (POSITIVE_TEMPLATES, (0.3, 1.0)),
+    (NEGATIVE_TEMPLATES, (-1.0, -0.3)),
+    (NEUTRAL_TEMPLATES, (-0.3, 0.3)),
+]
+
+
+def build_text_pool(size, seed):
+    # Equal thirds positive / negative / neutral; returns the texts and the (low, high) score range of each
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = np.random.default_rng(seed)
+    texts = []
+    score_ranges = []
+    for i in range(size):
+        templates, score_range = SENTIMENT_GROUPS[i % len(SENTIMENT_GROUPS)]
+        texts.append(templates[rng.integers(len(templates))](fake))
+        score_ranges.append(score_range)
+    return np.array(texts, dtype=object), np.array(score_ranges)
+
+
+def build_location_pools(size, seed):
+    fake = Faker()
+    fake.seed_instance(seed + 1)
+    return {
+        'name': np.array([fake.company() for _ in range(size)], dtype=object),
+        'emails': np.array([fake.company_email() for _ in range(size)], dtype=object),
+        'street_address': np.array([fake.street_address() for _ in range(size)], dtype=object),
+        'street_address2': np.array([fake.secondary_address() for _ in range(size)], dtype=object),
+        'timezone': np.array([fake.timezone() for _ in range(size)], dtype=object),
+        'postal_code': np.array([fake.postcode() for _ in range(size)], dtype=object),
+        'locality': np.array([fake.city() for _ in range(size)], dtype=object),
+        'region': np.array([fake.state_abbr() for _ in range(size)], dtype=object),
+    }
+
+
+def prefixed_ids(prefix, numbers):
+    # location_id / entity_id / comment_id are TEXT columns, e.g. loc-42
+    return np.char.add(prefix, numbers.astype(str)).astype(object)
+
+
+def assign_locations(num_tenants, min_locations, max_locations, seed,
+                     location_skew=DEFAULT_LOCATION_SKEW, comment_skew=DEFAULT_COMMENT_SKEW):
+    """
+    Return (location_tenants, location_weights), ordered by tenant.
+
+    Location i (id loc-<i + 1>) belongs to tenant location_tenants[i] and receives location_weights[i] of all
+    comments. Locations per tenant follow a Pareto distribution clipped to min..max, so a few tenants are much
+    larger than the rest; comment weights are Pareto too, giving a long tail of quiet locations.
+    """
+    rng = np.random.default_rng(seed)
+    locations_per_tenant = min_locations + np.floor(rng.pareto(location_skew, size=num_tenants) * min_locations)
+    locations_per_tenant = np.minimum(locations_per_tenant, max_locations).astype(np.int64)
+    location_tenants = np.repeat(np.arange(1, num_tenants + 1), locations_per_tenant)
+    location_weights = rng.pareto(comment_skew, size=len(location_tenants)) + 0.01
+    return location_tenants, location_weights / location_weights.sum()
+
+
+def plan_shards(num_tenants, min_locations, max_locations, num_comments, num_shards, seed,
+                location_skew=DEFAULT_LOCATION_SKEW, comment_skew=DEFAULT_COMMENT_SKEW):
+    """
+    Split the tenant range into `num_shards` contiguous shards.
+
+    Each shard owns whole tenants (and so whole locations) and a number of comments proportional to its
+    locations' comment weights. Location ids and comment ids are assigned globally, so shards never overlap,
+    and every shard gets its own deterministic seed derived from `seed`.
+    """
+    location_tenants, location_weights = assign_locations(num_tenants, min_locations, max_locations, seed,
+                                                          location_skew=location_skew, comment_skew=comment_skew)
+    tenant_bounds = np.array([1 + shard * num_tenants // num_shards for shard in range(num_shards + 1)])
+    location_bounds = np.searchsorted(location_tenants, tenant_bounds)
+
+    shard_weights = np.add.reduceat(location_weights, location_bounds[:-1])
+    comment_counts = np.floor(num_comments * shard_weights).astype(np.int64)
+    comment_counts[:num_comments - comment_counts.sum()] += 1
+    comment_starts = np.concatenate([[0], np.cumsum(comment_counts)[:-1]])
+
+    shards = []
+    for shard in range(num_shards):
+        weights = location_weights[location_bounds[shard]:location_bounds[shard + 1]]
+        shards.append({
+            'shard_index': shard,
+            'location_tenants': location_tenants[location_bounds[shard]:location_bounds[shard + 1]],
+            # Comments pick a location by inverting this CDF
+            'location_cdf': np.cumsum(weights) / weights.sum(),
+            'first_location_id': int(location_bounds[shard]) + 1,
+            'first_comment_id': int(comment_starts[shard]) + 1,
+            'num_comments': int(comment_counts[shard]),
+            'seed': np.random.SeedSequence([seed, shard]),
+        })
+    return shards
+
+
+def generate_shard(shard, chunk_size=DEFAULT_CHUNK_SIZE, end_date=None, pool_seed=42,
+                   text_pool_size=DEFAULT_TEXT_POOL_SIZE, location_pool_size=DEFAULT_LOCATION_POOL_SIZE):
+    """
+    Generate one shard from plan_shards.
+
+    Returns (locations, comment_chunks): a DataFrame with LOCATIONS_COLUMNS, and a generator of DataFrames of
+    at most `chunk_size` rows with COMMENTS_COLUMNS. Each comment's entity_id is one of the shard's locations
+    chosen by comment weight, and inherits its tenant and updated_date; the sentiment score matches the tone
+    of the sampled text. created_date increases with comment_id across the date range, like comments appended
+    as they are written, so the BRIN index on created_date can prune the generated data too.
+    """
+    rng = np.random.default_rng(shard['seed'])
+    end_date = end_date or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end_seconds = np.datetime64(end_date, 's')
+    range_seconds = CREATED_DATE_RANGE_DAYS * 24 * 60 * 60
+
+    def random_dates(size):
+        # datetime64[s]: written as 'YYYY-MM-DD HH:MM:SS' in CSV and as a timestamp in Parquet
+        return end_seconds - rng.integers(0, range_seconds, size=size).astype('timedelta64[s]')
+
+    location_pools = build_location_pools(location_pool_size, pool_seed)
+    location_tenants = shard['location_tenants']
+    num_locations = len(location_tenants)
+
+    def sample_pool(column):
+        return location_pools[column][rng.integers(0, location_pool_size, size=num_locations)]
+
+    location_ids = prefixed_ids('loc-', np.arange(shard['first_location_id'],
+                                                  shard['first_location_id'] + num_locations))
+    location_updated_dates = random_dates(num_locations)
+    # One industry per tenant
+    tenant_industries = INDUSTRIES[rng.integers(0, len(INDUSTRIES), size=location_tenants.max() + 1)]
+    street_address2 = sample_pool('street_address2')
+    street_address2[rng.random(num_locations) >= STREET_ADDRESS2_RATE] = None
+
+    locations = pd.DataFrame({
+        'name': sample_pool('name'),
+        'tenant_id': location_tenants,
+        'location_id': location_ids,
+        'location_type': LOCATION_TYPES[rng.integers(0, len(LOCATION_TYPES), size=num_locations)],
+        'emails': sample_pool('emails'),
+        'industry': tenant_industries[location_tenants],
+        'updated_date': location_updated_dates,
+        'country': 'US',
+        'street_address': sample_pool('street_address'),
+        'timezone': sample_pool('timezone'),
+        'postal_code': sample_pool('postal_code'),
+        'locality': sample_pool('locality'),
+        'street_address2': street_address2,
+        'region': sample_pool('region'),
+    }, columns=LOCATIONS_COLUMNS)
+
+    texts, score_ranges = build_text_pool(text_pool_size, pool_seed)
+    # Children of the shard seed, one per column (what SeedSequence.spawn would return, without mutating it)
+    streams = {
+        name: np.random.default_rng(np.random.SeedSequence(shard['seed'].entropy, spawn_key=(i,)))
+        for i, name in enumerate(COMMENT_STREAMS)
+    }
+
+    def comment_dates(start, size, num_comments):
+        # Comment i of n falls at a random point of the i-th of n equal slices of the range: uniform over the
+        # range and non-decreasing in i
+        slices = np.arange(start, start + size) + streams['created_date'].random(size)
+        offsets = np.floor(slices * range_seconds / num_comments).astype(np.int64)
+        return end_seconds - range_seconds + offsets.astype('timedelta64[s]')
+
+    def comment_chunks():
+        num_comments = shard['num_comments']
+        for start in range(0, num_comments, chunk_size):
+            size = min(chunk_size, num_comments - start)
+            location_index = np.minimum(np.searchsorted(shard['location_cdf'], streams['location'].random(size)),
+                                        num_locations - 1)
+            text_index = streams['text'].integers(0, len(texts), size=size)
+            low, high = score_ranges[text_index, 0], score_ranges[text_index, 1]
+            first_comment_id = shard['first_comment_id'] + start
+            yield pd.DataFrame({
+                'tenant_id': location_tenants[location_index],
+                'entity_id': location_ids[location_index],
+                'comment_id': prefixed_ids('cmt-', np.arange(first_comment_id, first_comment_id + size)),
+                'text': texts[text_index],
+                'created_date': comment_dates(start, size, num_comments),
+                'location_updated_date': location_updated_dates[location_index],
+                'overall_sentiment_score': np.round(low + (high - low) * streams['sentiment'].random(size), 4),
+                'text_language': streams['language'].choice(TEXT_LANGUAGES, size=size, p=TEXT_LANGUAGE_WEIGHTS),
+                'removed': streams['removed'].random(size) < REMOVED_RATE,
+            }, columns=COMMENTS_COLUMNS)
+
+    return locations, comment_chunks()
+
+
+def write_chunks_csv(chunks, output_filepath, column_types=None):
+    # Header with the first chunk, then append; returns the number of rows written
+    rows = 0
+    with open(output_filepath, 'w', newline='', encoding='utf-8') as csvfile:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(csvfile, header=(i == 0), index=False)
+            rows += len(chunk)
+    return rows
+
+
+WRITERS = {'csv': write_chunks_csv, 'parquet': write_parquet_chunks}
+
+
+def output_filepath(output_dir, filename, output_format, shard_index=None):
+    # comments.csv -> comments.parquet, or comments-00003.csv for shard 3
+    stem = os.path.splitext(filename)[0]
+    if shard_index is not None:
+        stem = f"{stem}-{shard_index:05d}"
+    return os.path.join(output_dir, f"{stem}.{output_format}")
+
+
+def write_shard(shard, output_dir, output_format, chunk_size, end_date, pool_seed, text_pool_size, sharded):
+    # Process-pool entry point: generate one shard into its own locations and comments files
+    locations, comment_chunks = generate_shard(shard, chunk_size=chunk_size, end_date=end_date,
+                                               pool_seed=pool_seed, text_pool_size=text_pool_size)
+    shard_index = shard['shard_index'] if sharded else None
+    locations_filepath = output_filepath(output_dir, LOCATIONS_FILENAME, output_format, shard_index)
+    comments_filepath = output_filepath(output_dir, COMMENTS_FILENAME, output_format, shard_index)
+    # Parquet files get the table's column types (int32 tenant ids, timestamp[us], ...)
+    location_rows = WRITERS[output_format]([locations], locations_filepath, TABLE_COLUMN_TYPES[LOCATIONS_TABLE])
+    comment_rows = WRITERS[output_format](comment_chunks, comments_filepath, TABLE_COLUMN_TYPES[COMMENTS_TABLE])
+    return (locations_filepath, location_rows), (comments_filepath, comment_rows)
+
+
+def load_shard(shard, chunk_size, end_date, pool_seed, text_pool_size, copy_format='binary'):
+    # Process-pool entry point: stream one shard into Postgres in a single transaction
+    locations, comment_chunks = generate_shard(shard, chunk_size=chunk_size, end_date=end_date,
+                                               pool_seed=pool_seed, text_pool_size=text_pool_size)
+    binary = copy_format == 'binary'
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            location_rows = copy_chunks(cur, LOCATIONS_TABLE, LOCATIONS_COLUMNS, [locations],
+                                        column_types=TABLE_COLUMN_TYPES[LOCATIONS_TABLE] if binary else None)
+            comment_rows = copy_chunks(cur, COMMENTS_TABLE, COMMENTS_COLUMNS, comment_chunks,
+                                       column_types=TABLE_COLUMN_TYPES[COMMENTS_TABLE] if binary else None)
+            # Bump the data versions in the same transaction so the API's result cache drops stale results
+            bump_data_version(cur, LOCATIONS_TABLE)
+            bump_data_version(cur, COMMENTS_TABLE)
+        conn.commit()
+    finally:
+        conn.close()
+    return (LOCATIONS_TABLE, location_rows), (COMMENTS_TABLE, comment_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic locations and comments.")
+    parser.add_argument('--tenants', type=int, default=20, help="Number of tenants.")
+    parser.add_argument('--min-locations', type=int, default=1, help="Minimum locations per tenant.")
+    parser.add_argument('--max-locations', type=int, default=200, help="Maximum locations per tenant.")
+    parser.add_argument('--location-skew', type=float, default=DEFAULT_LOCATION_SKEW,
+                        help="Pareto shape of locations per tenant; smaller gives a few much larger tenants.")
+    parser.add_argument('--comment-skew', type=float, default=DEFAULT_COMMENT_SKEW,
+                        help="Pareto shape of comments per location; smaller gives a longer tail.")
+    parser.add_argument('--comments', type=int, default=1000, help="Total number of comments.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows generated and written at a time.")
+    parser.add_argument('--text-pool-size', type=int, default=DEFAULT_TEXT_POOL_SIZE,
+                        help="Distinct comment texts generated with Faker and sampled per row.")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed; same seed and end date give the same output.")
+    parser.add_argument('--end-date', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help=f"Latest created_date (YYYY-MM-DD, default today); dates span the {CREATED_DATE_RANGE_DAYS} days before it.")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Split the tenants into this many shards, each written to its own files.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes generating shards in parallel.")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv', help="Output file format.")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--to-postgres', action='store_true',
+                        help="Stream rows into the existing locations and comments tables instead of writing files.")
+    parser.add_argument('--copy-format', choices=['binary', 'csv'], default='binary',
+                        help="COPY format used by --to-postgres.")
+    args = parser.parse_args()
+
+    if not 1 <= args.min_locations <= args.max_locations:
+        parser.error("--min-locations must be at least 1 and no more than --max-locations.")
+    if not 1 <= args.shards <= args.tenants:
+        parser.error("--shards must be between 1 and --tenants.")
+    if args.location_skew <= 0 or args.comment_skew <= 0:
+        parser.error("--location-skew and --comment-skew must be positive.")
+    if args.format == 'parquet' and pq is None:
+        parser.error("--format parquet requires pyarrow: pip install pyarrow")
+    if args.to_postgres and args.format != 'csv':
+        parser.error("--to-postgres streams rows straight into COPY (see --copy-format); --format does not apply.")
+
+    end_date = args.end_date or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    shards = plan_shards(args.tenants, args.min_locations, args.max_locations, args.comments, args.shards,
+                         args.seed, location_skew=args.location_skew, comment_skew=args.comment_skew)
+    sharded = args.shards > 1
+
+    if args.to_postgres:
+        # Created once up front; shards bump their versions concurrently
+        conn = connect_from_env()
+        try:
+            with conn.cursor() as cur:
+                ensure_data_version_table(cur)
+                ensure_rollups(cur)
+            conn.commit()
+        finally:
+            conn.close()
+        task, task_args = load_shard, (args.chunk_size, end_date, args.seed, args.text_pool_size, args.copy_format)
+        destination = "Postgres"
+    else:
+        # Ensure the data directory exists
+        os.makedirs(args.output_dir, exist_ok=True)
+        task, task_args = write_shard, (args.output_dir, args.format, args.chunk_size, end_date, args.seed,
+                                        args.text_pool_size, sharded)
+        destination = args.output_dir
+
+    if not sharded:
+        results = [task(shards[0], *task_args)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(task, shard, *task_args) for shard in shards]
+            results = [future.result() for future in futures]
+
+    if args.to_postgres:
+        # Once after all shards, rather than once per shard. It bumps the comments version again, so results
+        # cached from the rollup between the shard commits and the refresh are dropped
+        conn = connect_from_env()
+        try:
+            with conn.cursor() as cur:
+                refresh_comment_rollups(cur)
+            conn.commit()
+        finally:
+            conn.close()
+
+    total_locations = 0
+    total_comments = 0
+    for (locations_target, location_rows), (comments_target, comment_rows) in results:
+        total_locations += location_rows
+        total_comments += comment_rows
+        print(f"Written: {locations_target} ({location_rows} locations), "
+              f"{comments_target} ({comment_rows} comments)")
+
+    print(f"Successfully generated {total_locations} locations and {total_comments} comments "
+          f"for {args.tenants} tenants into {destination}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# code/parquet_io.py
+# Typed Parquet files as the intermediate format between the ingestion stages.
+#
+# Files are written with the Postgres column types from db_schema.TABLE_COLUMN_TYPES (int32, float64,
+# timestamp[us], bool, string), one compressed row group per chunk, so the next stage reads typed columns
+# instead of re-inferring dtypes and re-parsing timestamps from CSV text. Readers stream record batches and
+# only read the columns they need. pyarrow is optional for the rest of the project, so it is imported lazily.
+import numpy as np
+
+from postgres_copy import PG_EPOCH, coerce_chunk
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet support is optional
+    pa = None
+    pq = None
+
+PARQUET_COMPRESSION = 'zstd'
+# Microseconds between the Unix epoch and the Postgres epoch (2000-01-01) used by coerce_chunk
+PG_EPOCH_UNIX_MICROS = int(PG_EPOCH.astype(np.int64))
+
+
+def require_pyarrow():
+    if pq is None:
+        raise ImportError("Parquet support requires pyarrow: pip install pyarrow")
+
+
+def is_parquet_path(path):
+    return str(path).lower().endswith('.parquet')
+
+
+def arrow_schema(column_types):
+    require_pyarrow()
+    arrow_types = {
+        'int4': pa.int32(),
+        'float8': pa.float64(),
+        'timestamp': pa.timestamp('us'),
+        'bool': pa.bool_(),
+        'text': pa.string(),
+    }
+    return pa.schema([(column, arrow_types[pg_type]) for column, pg_type in column_types.items()])
+
+
+def typed_record_batch(chunk, column_types):
+    """
+    Convert a DataFrame chunk to a RecordBatch with arrow_schema(column_types).
+
+    Values are converted with the same rules as binary COPY (postgres_copy.coerce_chunk), so a value Postgres
+    would reject raises ValueError here, before the file is written.
+    """
+    schema = arrow_schema(column_types)
+    arrays = []
+    for field, (pg_type, values, mask) in zip(schema, coerce_chunk(chunk, column_types)):
+        if pg_type == 'timestamp':
+            values = values + PG_EPOCH_UNIX_MICROS
+        elif pg_type == 'text':
+            values = [None if is_null else str(value) for value, is_null in zip(values, mask)]
+        arrays.append(pa.array(values, type=field.type, mask=None if pg_type == 'text' else mask))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ParquetChunkWriter:
+    """Write DataFrame chunks to a typed Parquet file, one compressed row group per chunk."""
+
+    def __init__(self, output_filepath, column_types):
+        require_pyarrow()
+        self._column_types = column_types
+        self._writer = pq.ParquetWriter(output_filepath, arrow_schema(column_types), compression=PARQUET_COMPRESSION)
+        self.rows = 0
+
+    def write(self, chunk):
+        self._writer.write_batch(typed_record_batch(chunk, self._column_types))
+        self.rows += len(chunk)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_parquet_chunks(chunks, output_filepath, column_types):
+    # Returns the number of rows written
+    with ParquetChunkWriter(output_filepath, column_types) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.rows
+
+
+def parquet_row_groups(path):
+    require_pyarrow()
+    return pq.ParquetFile(path).num_row_groups
+
+
+def check_parquet_columns(path, columns):
+    require_pyarrow()
+    missing = [column for column in columns if column not in pq.ParquetFile(path).schema_arrow.names]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {', '.join(missing)}")
+
+
+def iter_parquet_frames(path, columns, batch_size, row_groups=None):
+    # DataFrames of at most `batch_size` rows with only `columns`, from all or some row groups
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups, columns=columns):
+        yield batch.to_pandas()
+
+
+def read_parquet_frame(path, columns):
+    # The whole file as one typed DataFrame with only `columns`
+    require_pyarrow()
+    return pq.read_table(path, columns=columns).to_pandas()
@@ -0,0 +1,248 @@
+# code/postgres_copy.py
+# Stream rows into Postgres with COPY without writing them to disk first.
+#
+# CopyStream is a read-only file-like object over an iterator of DataFrames: cursor.copy_expert pulls from it,
+# and each DataFrame is encoded only when the previous one has been sent. Rows can therefore be loaded while
+# they are still being generated, and memory holds one encoded chunk at a time.
+#
+# Chunks are encoded either as CSV text, which Postgres parses on the server, or in COPY's binary format:
+# every column is first converted client-side to its Postgres type (db_schema.TABLE_COLUMN_TYPES), so a bad
+# timestamp, number or boolean raises a ValueError naming the column before any byte of the chunk is sent,
+# and the server only copies fixed-width values instead of parsing text.
+import itertools
+import os
+import re
+import struct
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+# Bytes copy_expert asks for per read; larger reads mean fewer round trips through Python
+COPY_BUFFER_SIZE = 1 << 20
+
+# Binary COPY framing: signature, flags and header extension length, then one int16 -1 after the last row
+BINARY_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+BINARY_COPY_TRAILER = struct.pack('>h', -1)
+# A field is an int32 byte length followed by the value; NULL is length -1 with no value
+NULL_FIELD = struct.pack('>i', -1)
+# Binary timestamps are microseconds since 2000-01-01
+PG_EPOCH = np.datetime64('2000-01-01T00:00:00', 'us')
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+TRUE_STRINGS = {'t', 'true', 'y', 'yes', 'on', '1'}
+FALSE_STRINGS = {'f', 'false', 'n', 'no', 'off', '0'}
+# Zone suffix after the time of day: "+02", "-05:30", "Z" or BigQuery's " UTC"
+TIMESTAMP_ZONE = re.compile(r'(:\d{2}(?:\.\d+)?)\s*(?:Z|UTC|GMT|[+-]\d{2}(?::?\d{2})?)$', re.IGNORECASE)
+
+
+def encode_csv_chunk(chunk):
+    # No header: COPY ... WITH CSV without HEADER. None/NaN become empty fields, which COPY reads as NULL
+    return chunk.to_csv(index=False, header=False).encode('utf-8')
+
+
+def _coerce_int4(series):
+    numeric = pd.to_numeric(series, errors='raise')
+    mask = numeric.isna().to_numpy()
+    values = numeric.to_numpy(dtype=np.float64, na_value=0.0)
+    if (values != np.floor(values)).any():
+        raise ValueError(f"non-integer value {series[values != np.floor(values)].iloc[0]!r}")
+    if ((values < INT4_MIN) | (values > INT4_MAX)).any():
+        raise ValueError("value out of range for integer")
+    return values.astype(np.int64), mask
+
+
+def _coerce_float8(series):
+    numeric = pd.to_numeric(series, errors='raise')
+    return numeric.to_numpy(dtype=np.float64, na_value=0.0), numeric.isna().to_numpy()
+
+
+def _coerce_timestamp(series):
+    # TIMESTAMP columns have no time zone, and Postgres ignores a zone given in the input text, so it is
+    # dropped here too and the wall-clock time is kept: "2024-05-01 10:00:00+02" loads as 10:00 in both modes
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        series = series.dt.tz_localize(None)
+    elif pd.api.types.infer_dtype(series, skipna=True) == 'string':
+        series = series.str.replace(TIMESTAMP_ZONE, r'\1', regex=True)
+    try:
+        timestamps = pd.to_datetime(series, errors='raise', format='ISO8601')
+    except ValueError:
+        timestamps = pd.to_datetime(series, errors='raise', format='mixed')
+    mask = timestamps.isna().to_numpy()
+    micros = (timestamps.to_numpy().astype('datetime64[us]') - PG_EPOCH).astype(np.int64)
+    micros[mask] = 0
+    return micros, mask
+
+
+def _coerce_bool(series):
+    mask = series.isna().to_numpy()
+    if series.dtype == bool:
+        return series.to_numpy(), mask
+    text = series[~mask].astype(str).str.strip().str.lower()
+    unknown = ~text.isin(TRUE_STRINGS | FALSE_STRINGS)
+    if unknown.any():
+        raise ValueError(f"invalid boolean {series[~mask][unknown.to_numpy()].iloc[0]!r}")
+    values = np.zeros(len(series), dtype=bool)
+    values[~mask] = text.isin(TRUE_STRINGS).to_numpy()
+    return values, mask
+
+
+def _coerce_text(series):
+    mask = series.isna().to_numpy()
+    return series.to_numpy(dtype=object), mask
+
+
+COERCERS = {
+    'int4': _coerce_int4,
+    'float8': _coerce_float8,
+    'timestamp': _coerce_timestamp,
+    'bool': _coerce_bool,
+    'text': _coerce_text,
+}
+# Big-endian layout of the fixed-width types
+BINARY_DTYPES = {'int4': '>i4', 'float8': '>f8', 'timestamp': '>i8', 'bool': '?'}
+
+
+def coerce_chunk(chunk, column_types):
+    """
+    Convert every column of `chunk` to its Postgres type; returns [(pg_type, values, null_mask)].
+
+    Raises ValueError naming the column on the first value that does not convert.
+    """
+    converted = []
+    for column, pg_type in column_types.items():
+        try:
+            values, mask = COERCERS[pg_type](chunk[column])
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Column {column!r} ({pg_type}): {e}") from e
+        converted.append((pg_type, values, mask))
+    return converted
+
+
+def _fixed_width_fields(pg_type, values, mask):
+    # One length-prefixed field per row, packed with NumPy and sliced out of a single buffer
+    dtype = np.dtype(BINARY_DTYPES[pg_type])
+    packed = np.empty(len(values), dtype=[('length', '>i4'), ('value', dtype)])
+    packed['length'] = dtype.itemsize
+    packed['value'] = values
+    buffer = packed.tobytes()
+    width = packed.dtype.itemsize
+    fields = [buffer[offset:offset + width] for offset in range(0, len(buffer), width)]
+    for row in np.flatnonzero(mask):
+        fields[row] = NULL_FIELD
+    return fields
+
+
+def _text_fields(values, mask):
+    fields = []
+    for value, is_null in zip(values, mask):
+        if is_null:
+            fields.append(NULL_FIELD)
+        else:
+            encoded = str(value).encode('utf-8')
+            fields.append(struct.pack('>i', len(encoded)) + encoded)
+    return fields
+
+
+def encode_binary_chunk(chunk, column_types):
+    # Rows of a binary COPY stream (without the header and trailer CopyStream adds)
+    columns = []
+    for pg_type, values, mask in coerce_chunk(chunk, column_types):
+        if pg_type == 'text':
+            columns.append(_text_fields(values, mask))
+        else:
+            columns.append(_fixed_width_fields(pg_type, values, mask))
+    row_header = struct.pack('>h', len(columns))
+    return b''.join(itertools.chain.from_iterable(zip(itertools.repeat(row_header), *columns)))
+
+
+class CopyStream:
+    """
+    File-like adapter feeding an iterator of DataFrames to cursor.copy_expert.
+
+    `rows` counts the rows encoded so far, which equals the rows loaded once COPY has finished. `header` and
+    `trailer` are sent before the first and after the last chunk (the binary COPY framing).
+    """
+
+    def __init__(self, chunks, encode=encode_csv_chunk, header=b'', trailer=b''):
+        self._blocks = self._encoded_blocks(chunks, encode, header, trailer)
+        self._buffer = memoryview(b'')
+        self._offset = 0
+        self.rows = 0
+
+    def _encoded_blocks(self, chunks, encode, header, trailer):
+        if header:
+            yield header
+        for chunk in chunks:
+            encoded = encode(chunk)
+            self.rows += len(chunk)
+            if encoded:
+                yield encoded
+        if trailer:
+            yield trailer
+
+    def _fill(self):
+        # Encode the next chunk once the current one is used up; False when the iterator is exhausted
+        for block in self._blocks:
+            self._buffer = memoryview(block)
+            self._offset = 0
+            return True
+        return False
+
+    def read(self, size=-1):
+        if self._offset >= len(self._buffer) and not self._fill():
+            return b''
+        if size is None or size < 0:
+            parts = [self._buffer[self._offset:].tobytes()]
+            self._offset = len(self._buffer)
+            while self._fill():
+                parts.append(self._buffer.tobytes())
+                self._offset = len(self._buffer)
+            return b''.join(parts)
+        # At most one chunk per read: copy_expert simply reads again
+        data = self._buffer[self._offset:self._offset + size].tobytes()
+        self._offset += len(data)
+        return data
+
+
+def binary_copy_stream(chunks, column_types):
+    return CopyStream(chunks, encode=lambda chunk: encode_binary_chunk(chunk, column_types),
+                      header=BINARY_COPY_HEADER, trailer=BINARY_COPY_TRAILER)
+
+
+def copy_csv_sql(table, columns, header=False):
+    column_list = ", ".join(columns)
+    return f"COPY {table} ({column_list}) FROM STDIN WITH CSV{' HEADER' if header else ''} DELIMITER AS ','"
+
+
+def copy_binary_sql(table, columns):
+    return f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)"
+
+
+def copy_chunks(cur, table, columns, chunks, column_types=None):
+    """
+    COPY an iterator of DataFrames with `columns` into `table` through `cur`; returns the rows loaded.
+
+    With `column_types` ({column: pg_type}, in `columns` order) rows are converted client-side and sent in
+    COPY's binary format, otherwise as CSV.
+    """
+    if column_types is not None:
+        stream = binary_copy_stream(chunks, column_types)
+        copy_sql = copy_binary_sql(table, columns)
+    else:
+        stream = CopyStream(chunks)
+        copy_sql = copy_csv_sql(table, columns)
+    cur.copy_expert(sql=copy_sql, file=stream, size=COPY_BUFFER_SIZE)
+    return stream.rows
+
+
+def connect_from_env():
+    # Same DB_* settings from .env as the upload scripts
+    load_dotenv()
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+    )
@@ -0,0 +1,601 @@
+# code/postgres_loader.py
+# Parallel, resumable CSV and Parquet loader for the comments and locations tables.
+#
+# The input file is split into byte-range chunks that end on CSV record boundaries (newlines inside quoted
+# fields are skipped by tracking quote parity), and the chunks are loaded by several COPY streams over
+# parallel connections. Each chunk commits on its own, together with a row in the load_progress table, so a
+# failed or interrupted load resumes from the chunks already committed: just run the same command again.
+#
+# --mode upsert makes reloads idempotent: each chunk is COPY'd into a temporary (unlogged, per-connection)
+# staging table and merged with INSERT ... ON CONFLICT DO UPDATE, which only rewrites rows whose values
+# changed. Daily deltas, or a full re-export, can then be applied to live tables without truncating them.
+#
+# --rebuild-indexes drops the table's secondary indexes before the load and recreates them afterwards
+# (CREATE INDEX CONCURRENTLY, one at a time), which is much faster than maintaining them row by row. Their
+# definitions are saved in load_dropped_indexes first, so an interrupted load recreates them on the next run.
+# Loaded tables are ANALYZEd so the planner sees the new statistics, and every phase is timed. A comments load
+# also refreshes the comment rollups (rollups.py) in the transaction that bumps the data version; only the
+# (tenant, location, month) buckets the load touched are recomputed.
+#
+# --copy-format binary parses each chunk client-side with pandas, converts every column to its Postgres type
+# and sends COPY's binary format (postgres_copy.py), so the server skips text parsing. --validate first checks
+# every chunk that way without loading anything, so type errors surface before the load starts. In binary
+# mode an empty field is NULL, including a quoted "" in a TEXT column.
+#
+# Parquet files (*.parquet, written by faker_data.py and explode_address.py with --format parquet) are loaded
+# the same way, with one row group per chunk instead of byte ranges: only the table's columns are read, as
+# typed record batches, and always sent as binary COPY, so nothing is parsed from text on either side.
+#
+# Usage (from the project root, DB_* settings are read from .env):
+#   python code/postgres_loader.py comments data/comments.csv --workers 4 --chunk-mb 64
+#   python code/postgres_loader.py locations data/locations_exploded_final.csv
+#   python code/postgres_loader.py comments data/comments.csv --restart   # forget progress, load everything
+#   python code/postgres_loader.py comments data/comments_delta.csv --mode upsert
+#   python code/postgres_loader.py comments data/comments.csv --rebuild-indexes --workers 8
+#   python code/postgres_loader.py comments data/comments.csv --copy-format binary --validate
+#   python code/postgres_loader.py comments data/comments.parquet
+import argparse
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2 import sql
+
+from data_version import bump_data_version
+from db_schema import COMMENTS_TABLE, TABLE_COLUMN_TYPES, TABLE_COLUMNS, TABLE_PRIMARY_KEYS
+from parquet_io import check_parquet_columns, is_parquet_path, iter_parquet_frames, parquet_row_groups
+from postgres_copy import (COPY_BUFFER_SIZE, binary_copy_stream, coerce_chunk, connect_from_env, copy_binary_sql,
+                           copy_csv_sql)
+from rollups import ensure_rollups, refresh_comment_rollups
+
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_MB = 64
+# Bytes read at a time while scanning for record boundaries
+SCAN_BLOCK_SIZE = 8 << 20
+LOAD_MODES = ('append', 'upsert')
+COPY_FORMATS = ('csv', 'binary')
+# Rows parsed and converted at a time by the binary path
+BINARY_PARSE_ROWS = 50000
+
+LOAD_PROGRESS_TABLE = "load_progress"
+
+CREATE_LOAD_PROGRESS_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {LOAD_PROGRESS_TABLE} (
+        load_id TEXT NOT NULL,
+        chunk_start BIGINT NOT NULL,
+        chunk_end BIGINT NOT NULL,
+        rows_loaded BIGINT NOT NULL,
+        loaded_at TIMESTAMP NOT NULL DEFAULT now(),
+        PRIMARY KEY (load_id, chunk_start)
+    )
+"""
+
+DROPPED_INDEXES_TABLE = "load_dropped_indexes"
+
+CREATE_DROPPED_INDEXES_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {DROPPED_INDEXES_TABLE} (
+        index_name TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        definition TEXT NOT NULL,
+        dropped_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+# Indexes of a table that do not back a constraint (primary key, unique, exclusion): those stay in place
+SECONDARY_INDEXES_SQL = """
+    SELECT i.relname, pg_get_indexdef(i.oid)
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    WHERE x.indrelid = %s::regclass
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    ORDER BY i.relname
+"""
+
+# Returns a row when the named index exists but is invalid, e.g. after a killed CREATE INDEX CONCURRENTLY
+INVALID_INDEX_SQL = """
+    SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(quote_ident(%s)) AND NOT indisvalid
+"""
+
+
+def plan_chunks(path, chunk_bytes, header=True, block_size=SCAN_BLOCK_SIZE):
+    """
+    Return [(start, end)] byte ranges covering the records of a CSV file, each about `chunk_bytes` long.
+
+    Every range ends right after a newline that is outside quoted fields (an even number of '"' so far; an
+    escaped quote "" counts twice and keeps the parity), so every chunk holds whole records. The header line
+    is not part of any chunk.
+    """
+    with open(path, 'rb') as f:
+        data_start = len(f.readline()) if header else 0
+        f.seek(data_start)
+        boundaries = [data_start]
+        next_target = data_start + chunk_bytes
+        block_start = data_start
+        quotes = 0
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            scanned = 0
+            search = max(0, next_target - block_start)
+            while search < len(block):
+                newline = block.find(b'\n', search)
+                if newline < 0:
+                    break
+                quotes += block.count(b'"', scanned, newline)
+                scanned = newline
+                if quotes % 2 == 0:
+                    boundaries.append(block_start + newline + 1)
+                    next_target = block_start + newline + 1 + chunk_bytes
+                    search = max(newline + 1, next_target - block_start)
+                else:
+                    search = newline + 1
+            quotes += block.count(b'"', scanned)
+            block_start += len(block)
+    if boundaries[-1] < block_start:
+        boundaries.append(block_start)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+class RangeReader(io.RawIOBase):
+    """Read-only file-like view of bytes [start, end) of a file, for cursor.copy_expert and pandas.read_csv."""
+
+    def __init__(self, path, start, end):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def plan_row_groups(path):
+    # Parquet chunks are row groups, as (index, index + 1) so they fit the byte-range bookkeeping
+    return [(row_group, row_group + 1) for row_group in range(parquet_row_groups(path))]
+
+
+def read_chunk_frames(reader, columns):
+    # DataFrames of at most BINARY_PARSE_ROWS rows of a RangeReader, every field as a string and empty fields NaN
+    return pd.read_csv(io.BufferedReader(reader), header=None, names=columns, dtype=str,
+                       keep_default_na=False, na_values=[''], chunksize=BINARY_PARSE_ROWS)
+
+
+def read_row_group_frames(path, row_group, columns):
+    # Typed DataFrames of at most BINARY_PARSE_ROWS rows of one Parquet row group, only `columns`
+    return iter_parquet_frames(path, columns, BINARY_PARSE_ROWS, row_groups=[row_group])
+
+
+def validate_chunks(path, chunks, columns, column_types, workers=DEFAULT_WORKERS):
+    """Parse and type-convert every chunk without loading it; raises ValueError naming the chunk and column."""
+    def frames(reader, start):
+        if reader is None:
+            return read_row_group_frames(path, start, columns)
+        return read_chunk_frames(reader, columns)
+
+    def validate(chunk):
+        start, end = chunk
+        rows = 0
+        reader = None if is_parquet_path(path) else RangeReader(path, start, end)
+        try:
+            for frame in frames(reader, start):
+                try:
+                    coerce_chunk(frame, column_types)
+                except ValueError as e:
+                    raise ValueError(f"Chunk {start}-{end}, rows {rows + 1}-{rows + len(frame)}: {e}") from e
+                rows += len(frame)
+        finally:
+            if reader is not None:
+                reader.close()
+        return rows
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return sum(executor.map(validate, chunks))
+
+
+# Position of a row within its chunk, in the upsert staging table
+STAGING_ORDER_COLUMN = "staging_row"
+
+
+def load_id_for(table, path, mode='append'):
+    # Identifies one file loaded into one table; a changed file (size or mtime) starts a new load
+    stat = os.stat(path)
+    return f"{table}:{mode}:{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def staging_table_sql(table):
+    # Temporary tables are unlogged and private to the connection, so parallel workers never share one.
+    # ON COMMIT DELETE ROWS empties it after every chunk. COPY leaves the identity column out, so it numbers
+    # the rows in file order.
+    return (f"CREATE TEMP TABLE IF NOT EXISTS {table}_staging "
+            f"(LIKE {table} INCLUDING DEFAULTS, {STAGING_ORDER_COLUMN} BIGINT GENERATED ALWAYS AS IDENTITY) "
+            f"ON COMMIT DELETE ROWS")
+
+
+def upsert_sql(table, columns, primary_key):
+    """
+    Merge {table}_staging into `table`: insert new rows, update rows whose values changed, skip the rest.
+
+    DISTINCT ON keeps one row per key, since ON CONFLICT cannot update the same row twice in one statement:
+    the last one in file order, as if the rows were applied one after another. Merging in key order also
+    makes parallel chunks lock rows they share in the same order.
+    """
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column != primary_key)
+    current = ", ".join(f"{table}.{column}" for column in columns if column != primary_key)
+    incoming = ", ".join(f"EXCLUDED.{column}" for column in columns if column != primary_key)
+    return (
+        f"INSERT INTO {table} ({column_list}) "
+        f"SELECT DISTINCT ON ({primary_key}) {column_list} FROM {table}_staging "
+        f"ORDER BY {primary_key}, {STAGING_ORDER_COLUMN} DESC "
+        f"ON CONFLICT ({primary_key}) DO UPDATE SET {updates} "
+        f"WHERE ({current}) IS DISTINCT FROM ({incoming})"
+    )
+
+
+@contextmanager
+def timed_phase(phases, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = round(phases.get(name, 0.0) + time.perf_counter() - started, 3)
+
+
+def drop_secondary_indexes(table):
+    """Save the definitions of `table`'s secondary indexes in load_dropped_indexes and drop them; returns their names."""
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_DROPPED_INDEXES_TABLE_SQL)
+            cur.execute(SECONDARY_INDEXES_SQL, (table,))
+            indexes = cur.fetchall()
+            for index_name, definition in indexes:
+                cur.execute(
+                    f"INSERT INTO {DROPPED_INDEXES_TABLE} (index_name, table_name, definition) VALUES (%s, %s, %s) "
+                    f"ON CONFLICT (index_name) DO UPDATE SET definition = EXCLUDED.definition",
+                    (index_name, table, definition),
+                )
+                cur.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(index_name)))
+        # Definitions and drops commit together, so no index is lost without a record
+        conn.commit()
+    finally:
+        conn.close()
+    return [index_name for index_name, _ in indexes]
+
+
+def concurrent_index_sql(definition):
+    # "CREATE [UNIQUE] INDEX name ON ..." from pg_get_indexdef -> CONCURRENTLY IF NOT EXISTS
+    return re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX CONCURRENTLY IF NOT EXISTS ', definition)
+
+
+def blocking_index_sql(definition):
+    return re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX IF NOT EXISTS ', definition)
+
+
+def rebuild_dropped_indexes(table, workers=DEFAULT_WORKERS, concurrently=True):
+    """
+    Recreate the indexes recorded in load_dropped_indexes for `table`.
+
+    CREATE INDEX CONCURRENTLY does not block writers; if it fails, the invalid index it leaves behind is
+    dropped and the index is built again without CONCURRENTLY. An invalid index left by a run that was killed
+    mid-build is dropped first, since IF NOT EXISTS would otherwise keep it. Concurrent builds on one table
+    wait for each other, so they run one at a time; blocking builds run `workers` at a time. Returns the names
+    of the rebuilt indexes.
+    """
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_DROPPED_INDEXES_TABLE_SQL)
+            cur.execute(f"SELECT index_name, definition FROM {DROPPED_INDEXES_TABLE} WHERE table_name = %s", (table,))
+            indexes = cur.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+
+    def rebuild(index):
+        index_name, definition = index
+        conn = connect_from_env()
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(INVALID_INDEX_SQL, (index_name,))
+                if cur.fetchone() is not None:
+                    print(f"Dropping invalid index {index_name} left by an interrupted build.")
+                    drop = "DROP INDEX CONCURRENTLY IF EXISTS {}" if concurrently else "DROP INDEX IF EXISTS {}"
+                    cur.execute(sql.SQL(drop).format(sql.Identifier(index_name)))
+                try:
+                    cur.execute(concurrent_index_sql(definition) if concurrently else blocking_index_sql(definition))
+                except psycopg2.Error as e:
+                    if not concurrently:
+                        raise
+                    print(f"Concurrent build of {index_name} failed ({e}); rebuilding it without CONCURRENTLY.")
+                    cur.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(index_name)))
+                    cur.execute(blocking_index_sql(definition))
+                cur.execute(f"DELETE FROM {DROPPED_INDEXES_TABLE} WHERE index_name = %s", (index_name,))
+        finally:
+            conn.close()
+        return index_name
+
+    with ThreadPoolExecutor(max_workers=1 if concurrently else max(1, workers)) as executor:
+        return list(executor.map(rebuild, indexes))
+
+
+def analyze_table(table):
+    conn = connect_from_env()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+    finally:
+        conn.close()
+
+
+def publish_load(table, refresh_rollups, phases):
+    # Rows commit chunk by chunk; bump the data version once so the API's result cache drops stale results.
+    # refresh_comment_rollups bumps the comments version together with the refreshed rollup.
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            if refresh_rollups and table == COMMENTS_TABLE:
+                with timed_phase(phases, 'rollups'):
+                    refresh_comment_rollups(cur)
+            else:
+                bump_data_version(cur, table)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_committed_chunks(cur, load_id):
+    cur.execute(f"SELECT chunk_start, chunk_end FROM {LOAD_PROGRESS_TABLE} WHERE load_id = %s", (load_id,))
+    return set(cur.fetchall())
+
+
+def load_csv(table, path, workers=DEFAULT_WORKERS, chunk_mb=DEFAULT_CHUNK_MB, header=True, restart=False,
+             mode='append', rebuild_indexes=False, concurrent_indexes=True, analyze=True, copy_format=None,
+             validate=False, refresh_rollups=True):
+    """
+    Load a CSV or Parquet file into `table` with parallel COPY streams, one transaction per chunk.
+
+    `mode='append'` COPYs straight into the table; `mode='upsert'` merges through a staging table, so rows
+    already present are updated (only when changed) instead of failing on the primary key.
+
+    `copy_format='binary'` converts rows to their Postgres types client-side and sends binary COPY; with
+    `validate`, every pending chunk is converted once before anything is loaded. CSV files default to 'csv'.
+    Parquet files are split into row groups (`chunk_mb` and `header` do not apply) and always use 'binary'.
+
+    With `rebuild_indexes`, secondary indexes are dropped before the load and rebuilt afterwards (also when
+    the load fails); with `analyze`, the table is ANALYZEd once rows changed. Whenever chunks were committed,
+    also by a load that then fails, the table's data version is bumped, and with `refresh_rollups` a
+    comments load refreshes the comment rollups in that transaction.
+
+    Chunks committed by an earlier run of the same file are skipped, unless `restart` is set. Returns a
+    summary with the rows loaded, rows inserted or changed, chunk counts, rows per second and the seconds
+    spent in each phase. Raises the first chunk error after the chunks already in flight have finished; their
+    progress is kept for the next run.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode {mode!r}; expected one of {LOAD_MODES}.")
+    parquet = is_parquet_path(path)
+    if copy_format is None:
+        copy_format = 'binary' if parquet else 'csv'
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"Unknown COPY format {copy_format!r}; expected one of {COPY_FORMATS}.")
+    if parquet and copy_format != 'binary':
+        raise ValueError("Parquet files are loaded with binary COPY only.")
+    columns = TABLE_COLUMNS[table]
+    load_id = load_id_for(table, path, mode)
+    chunk_bytes = int(chunk_mb * 1024 * 1024)
+    phases = {}
+    with timed_phase(phases, 'plan_chunks'):
+        if parquet:
+            check_parquet_columns(path, columns)
+            chunks = plan_row_groups(path)
+        else:
+            chunks = plan_chunks(path, chunk_bytes, header=header)
+
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_LOAD_PROGRESS_TABLE_SQL)
+            if restart:
+                cur.execute(f"DELETE FROM {LOAD_PROGRESS_TABLE} WHERE load_id = %s", (load_id,))
+            committed = get_committed_chunks(cur, load_id)
+            if refresh_rollups and table == COMMENTS_TABLE:
+                # The triggers recording the buckets this load touches must exist before it starts
+                ensure_rollups(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+    if committed and not committed.issubset(chunks):
+        raise ValueError(f"Committed chunks of {path} do not match the planned chunks; rerun with the "
+                         f"--chunk-mb used originally, or --restart.")
+    pending = [chunk for chunk in chunks if chunk not in committed]
+    print(f"Loading {path} into {table} ({mode}): {len(chunks)} chunks, {len(chunks) - len(pending)} already "
+          f"committed, {workers} workers.")
+
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+    failed = threading.Event()
+    copy_target = f"{table}_staging" if mode == 'upsert' else table
+    merge_sql = upsert_sql(table, columns, TABLE_PRIMARY_KEYS[table]) if mode == 'upsert' else None
+    if copy_format == 'binary':
+        copy_sql = copy_binary_sql(copy_target, columns)
+    else:
+        copy_sql = copy_csv_sql(copy_target, columns)
+
+    def load_chunk(chunk):
+        # Returns (rows in the chunk, rows inserted or changed)
+        if failed.is_set():
+            return None
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = connect_from_env()
+            with connections_lock:
+                connections.append(conn)
+            if merge_sql is not None:
+                with conn.cursor() as cur:
+                    cur.execute(staging_table_sql(table))
+                conn.commit()
+        start, end = chunk
+        reader = None if parquet else RangeReader(path, start, end)
+        if parquet:
+            source = binary_copy_stream(read_row_group_frames(path, start, columns), column_types)
+        elif copy_format == 'binary':
+            source = binary_copy_stream(read_chunk_frames(reader, columns), column_types)
+        else:
+            source = reader
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(sql=copy_sql, file=source, size=COPY_BUFFER_SIZE)
+                rows = changed = cur.rowcount
+                if merge_sql is not None:
+                    cur.execute(merge_sql)
+                    changed = cur.rowcount
+                cur.execute(
+                    f"INSERT INTO {LOAD_PROGRESS_TABLE} (load_id, chunk_start, chunk_end, rows_loaded) "
+                    f"VALUES (%s, %s, %s, %s)",
+                    (load_id, start, end, rows),
+                )
+            conn.commit()
+            return rows, changed
+        except Exception:
+            conn.rollback()
+            failed.set()
+            raise
+        finally:
+            if reader is not None:
+                reader.close()
+
+    column_types = TABLE_COLUMN_TYPES[table]
+    if validate and pending:
+        with timed_phase(phases, 'validate'):
+            validated_rows = validate_chunks(path, pending, columns, column_types, workers=workers)
+        print(f"Validated {validated_rows} rows of {path}.")
+
+    dropped_indexes = []
+    if rebuild_indexes and pending:
+        with timed_phase(phases, 'drop_indexes'):
+            dropped_indexes = drop_secondary_indexes(table)
+        print(f"Dropped secondary indexes of {table}: {', '.join(dropped_indexes) or 'none'}")
+
+    started = time.perf_counter()
+    rows_loaded = 0
+    rows_changed = 0
+    chunks_loaded = 0
+    first_error = None
+    try:
+        with timed_phase(phases, 'copy'), ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(load_chunk, chunk): chunk for chunk in pending}
+            for future in as_completed(futures):
+                start, end = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Chunk {start}-{end} failed: {e}")
+                    first_error = first_error or e
+                    continue
+                if result is None:
+                    continue
+                rows, changed = result
+                rows_loaded += rows
+                rows_changed += changed
+                chunks_loaded += 1
+                elapsed = time.perf_counter() - started
+                print(f"Chunk {start}-{end}: {rows} rows, {changed} inserted or changed "
+                      f"({chunks_loaded}/{len(pending)}, {rows_loaded / elapsed:.0f} rows/s)")
+    finally:
+        for conn in connections:
+            conn.close()
+        elapsed = time.perf_counter() - started
+        if rebuild_indexes:
+            # Also picks up indexes left dropped by an interrupted earlier run
+            with timed_phase(phases, 'rebuild_indexes'):
+                rebuilt = rebuild_dropped_indexes(table, workers=workers, concurrently=concurrent_indexes)
+            if rebuilt:
+                print(f"Rebuilt indexes of {table}: {', '.join(rebuilt)}")
+        # Also after a failed load, whose committed chunks are visible, and after a rerun that found every chunk
+        # committed, in case the run that committed them died before getting here
+        if chunks_loaded or not pending:
+            publish_load(table, refresh_rollups, phases)
+
+    if first_error is not None:
+        raise first_error
+
+    if rows_changed and analyze:
+        with timed_phase(phases, 'analyze'):
+            analyze_table(table)
+
+    return {
+        'table': table,
+        'path': path,
+        'chunks': len(chunks),
+        'chunks_loaded': chunks_loaded,
+        'chunks_skipped': len(chunks) - len(pending),
+        'rows_loaded': rows_loaded,
+        'rows_changed': rows_changed,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(rows_loaded / elapsed, 2) if elapsed > 0 else 0.0,
+        'phases': phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, resumable CSV/Parquet loader for comments and locations.")
+    parser.add_argument('table', choices=sorted(TABLE_COLUMNS))
+    parser.add_argument('path', help="CSV file with the table's columns in DDL order, or a .parquet file.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Parallel COPY connections.")
+    parser.add_argument('--chunk-mb', type=float, default=DEFAULT_CHUNK_MB, help="Approximate chunk size in MB.")
+    parser.add_argument('--no-header', action='store_true', help="The file has no header line.")
+    parser.add_argument('--restart', action='store_true', help="Forget committed chunks of this file and load it all.")
+    parser.add_argument('--mode', choices=LOAD_MODES, default='append',
+                        help="'append' COPYs straight into the table; 'upsert' merges through a staging table.")
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help="Drop secondary indexes before loading and rebuild them afterwards.")
+    parser.add_argument('--blocking-index-build', action='store_true',
+                        help="Rebuild indexes without CONCURRENTLY (faster, but blocks writes to the table).")
+    parser.add_argument('--no-analyze', action='store_true', help="Skip ANALYZE after the load.")
+    parser.add_argument('--no-rollups', action='store_true',
+                        help="Do not refresh the comment rollups after a comments load (run rollups.py later).")
+    parser.add_argument('--copy-format', choices=COPY_FORMATS, default=None,
+                        help="'binary' converts values to their Postgres types client-side and sends binary COPY "
+                             "(default: csv for CSV files, binary for Parquet).")
+    parser.add_argument('--validate', action='store_true',
+                        help="Type-check every chunk before loading anything (binary conversion rules).")
+    args = parser.parse_args()
+
+    summary = load_csv(args.table, args.path, workers=args.workers, chunk_mb=args.chunk_mb,
+                       header=not args.no_header, restart=args.restart, mode=args.mode,
+                       rebuild_indexes=args.rebuild_indexes, concurrent_indexes=not args.blocking_index_build,
+                       analyze=not args.no_analyze, copy_format=args.copy_format, validate=args.validate,
+                       refresh_rollups=not args.no_rollups)
+    print(f"Loaded {summary['rows_loaded']} rows into {summary['table']} in {summary['elapsed_seconds']}s "
+          f"({summary['rows_per_second']} rows/s), {summary['rows_changed']} inserted or changed; "
+          f"{summary['chunks_skipped']} chunks were already committed.")
+    print("Phase timings: " + ", ".join(f"{phase} {seconds}s" for phase, seconds in summary['phases'].items()))
+
+
+if __name__ == '__main__':
+    main()
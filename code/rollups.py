@@ -0,0 +1,268 @@
+# code/rollups.py
+# Precomputed comment aggregates, so the common questions (comments per location, per tenant, per month,
+# sentiment) answer from a few thousand rows instead of scanning and joining all of `comments`.
+#
+# comment_monthly_rollup holds one row per (tenant_id, entity_id, month) with the comment count, removed
+# count and the sentiment sum/count (avg_sentiment is derived from them, so the rows can be re-aggregated).
+# The per-location and per-tenant views sum it up.
+#
+# Maintenance is proportional to the size of a load, not of the table: statement-level triggers on `comments`
+# record the buckets touched by every INSERT, UPDATE and DELETE (COPY and upsert merges included) in
+# comment_rollup_dirty_buckets, using transition tables, so there is one insert per statement rather than per
+# row. A refresh claims the recorded buckets and recomputes only those from `comments`, rewriting buckets
+# whose values changed and deleting buckets left empty. The loaders refresh after every comments load, in the
+# transaction that bumps the data version. TRUNCATE of `comments` empties the rollup.
+#
+# Usage (from the project root, DB_* settings are read from .env):
+#   python code/rollups.py          # install the rollups if needed and refresh the recorded buckets
+#   python code/rollups.py --full   # recompute every bucket
+import argparse
+
+from data_version import bump_data_version
+from db_schema import COMMENTS_ENTITY_INDEX_DDL, COMMENTS_TABLE
+from postgres_copy import connect_from_env
+
+COMMENT_ROLLUP_TABLE = "comment_monthly_rollup"
+LOCATION_ROLLUP_VIEW = "location_comment_rollup"
+TENANT_ROLLUP_VIEW = "tenant_comment_rollup"
+DIRTY_BUCKETS_TABLE = "comment_rollup_dirty_buckets"
+
+CREATE_COMMENT_ROLLUP_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {COMMENT_ROLLUP_TABLE} (
+        tenant_id INTEGER NOT NULL,
+        entity_id TEXT NOT NULL,
+        month DATE NOT NULL,
+        comment_count BIGINT NOT NULL,
+        removed_count BIGINT NOT NULL,
+        sentiment_sum DOUBLE PRECISION NOT NULL,
+        sentiment_count BIGINT NOT NULL,
+        avg_sentiment DOUBLE PRECISION GENERATED ALWAYS AS (sentiment_sum / NULLIF(sentiment_count, 0)) STORED,
+        PRIMARY KEY (tenant_id, entity_id, month)
+    )
+"""
+
+CREATE_LOCATION_ROLLUP_VIEW_SQL = f"""
+    CREATE OR REPLACE VIEW {LOCATION_ROLLUP_VIEW} AS
+    SELECT tenant_id,
+           entity_id AS location_id,
+           SUM(comment_count) AS comment_count,
+           SUM(removed_count) AS removed_count,
+           SUM(sentiment_sum) / NULLIF(SUM(sentiment_count), 0) AS avg_sentiment,
+           MIN(month) AS first_month,
+           MAX(month) AS last_month
+    FROM {COMMENT_ROLLUP_TABLE}
+    GROUP BY tenant_id, entity_id
+"""
+
+CREATE_TENANT_ROLLUP_VIEW_SQL = f"""
+    CREATE OR REPLACE VIEW {TENANT_ROLLUP_VIEW} AS
+    SELECT tenant_id,
+           SUM(comment_count) AS comment_count,
+           SUM(removed_count) AS removed_count,
+           COUNT(DISTINCT entity_id) AS locations_with_comments,
+           SUM(sentiment_sum) / NULLIF(SUM(sentiment_count), 0) AS avg_sentiment
+    FROM {COMMENT_ROLLUP_TABLE}
+    GROUP BY tenant_id
+"""
+
+# The table first: the views depend on it
+ROLLUP_DDL = [CREATE_COMMENT_ROLLUP_TABLE_SQL, CREATE_LOCATION_ROLLUP_VIEW_SQL, CREATE_TENANT_ROLLUP_VIEW_SQL]
+
+# Append-only on purpose: without a unique key, parallel COPY chunks touching the same bucket never wait on
+# each other. Duplicates are collapsed when a refresh claims the rows.
+CREATE_DIRTY_BUCKETS_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {DIRTY_BUCKETS_TABLE} (
+        tenant_id INTEGER NOT NULL,
+        entity_id TEXT NOT NULL,
+        month DATE NOT NULL
+    )
+"""
+
+# A function can read whichever transition tables its trigger defines; each branch only runs for its events
+CREATE_RECORD_BUCKETS_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION record_comment_rollup_buckets() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO {DIRTY_BUCKETS_TABLE} (tenant_id, entity_id, month)
+            SELECT DISTINCT tenant_id, entity_id, date_trunc('month', created_date)::date
+            FROM old_rows
+            WHERE tenant_id IS NOT NULL AND entity_id IS NOT NULL AND created_date IS NOT NULL;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO {DIRTY_BUCKETS_TABLE} (tenant_id, entity_id, month)
+            SELECT DISTINCT tenant_id, entity_id, date_trunc('month', created_date)::date
+            FROM new_rows
+            WHERE tenant_id IS NOT NULL AND entity_id IS NOT NULL AND created_date IS NOT NULL;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+CREATE_RESET_ROLLUP_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION reset_comment_rollup() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        TRUNCATE {COMMENT_ROLLUP_TABLE}, {DIRTY_BUCKETS_TABLE};
+        RETURN NULL;
+    END
+    $$
+"""
+
+# Transition tables allow one event per trigger
+ROLLUP_TRIGGERS = {
+    'comments_rollup_insert': "AFTER INSERT ON comments REFERENCING NEW TABLE AS new_rows "
+                              "FOR EACH STATEMENT EXECUTE FUNCTION record_comment_rollup_buckets()",
+    'comments_rollup_update': "AFTER UPDATE ON comments REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+                              "FOR EACH STATEMENT EXECUTE FUNCTION record_comment_rollup_buckets()",
+    'comments_rollup_delete': "AFTER DELETE ON comments REFERENCING OLD TABLE AS old_rows "
+                              "FOR EACH STATEMENT EXECUTE FUNCTION record_comment_rollup_buckets()",
+    'comments_rollup_truncate': "AFTER TRUNCATE ON comments "
+                                "FOR EACH STATEMENT EXECUTE FUNCTION reset_comment_rollup()",
+}
+
+# What ensure_rollups installs, in dependency order: (name, to_regclass/to_regprocedure lookup, DDL). Only
+# missing objects are created, so loads never take the DDL locks of an existing view or index.
+ROLLUP_OBJECTS = [
+    (COMMENT_ROLLUP_TABLE, 'regclass', CREATE_COMMENT_ROLLUP_TABLE_SQL),
+    (LOCATION_ROLLUP_VIEW, 'regclass', CREATE_LOCATION_ROLLUP_VIEW_SQL),
+    (TENANT_ROLLUP_VIEW, 'regclass', CREATE_TENANT_ROLLUP_VIEW_SQL),
+    (DIRTY_BUCKETS_TABLE, 'regclass', CREATE_DIRTY_BUCKETS_TABLE_SQL),
+    ('record_comment_rollup_buckets()', 'regprocedure', CREATE_RECORD_BUCKETS_FUNCTION_SQL),
+    ('reset_comment_rollup()', 'regprocedure', CREATE_RESET_ROLLUP_FUNCTION_SQL),
+    ('comments_entity_id_created_date_idx', 'regclass', COMMENTS_ENTITY_INDEX_DDL),
+]
+
+EXISTING_TRIGGERS_SQL = "SELECT tgname FROM pg_trigger WHERE tgrelid = 'comments'::regclass AND NOT tgisinternal"
+
+# Refreshes of the rollup run one at a time; loads keep recording buckets meanwhile
+LOCK_ROLLUP_SQL = f"SELECT pg_advisory_xact_lock(hashtext('{COMMENT_ROLLUP_TABLE}'))"
+
+_BUCKET_AGGREGATES = """
+               COUNT(*) AS comment_count,
+               COUNT(*) FILTER (WHERE c.removed) AS removed_count,
+               COALESCE(SUM(c.overall_sentiment_score), 0) AS sentiment_sum,
+               COUNT(c.overall_sentiment_score) AS sentiment_count"""
+
+# Insert new buckets, update changed ones; `fresh` is defined by the refresh statement
+_UPSERT_FRESH_BUCKETS = f"""
+    upserted AS (
+        INSERT INTO {COMMENT_ROLLUP_TABLE} (tenant_id, entity_id, month, comment_count, removed_count,
+                                            sentiment_sum, sentiment_count)
+        SELECT * FROM fresh
+        ON CONFLICT (tenant_id, entity_id, month) DO UPDATE
+        SET comment_count = EXCLUDED.comment_count,
+            removed_count = EXCLUDED.removed_count,
+            sentiment_sum = EXCLUDED.sentiment_sum,
+            sentiment_count = EXCLUDED.sentiment_count
+        WHERE ({COMMENT_ROLLUP_TABLE}.comment_count, {COMMENT_ROLLUP_TABLE}.removed_count,
+               {COMMENT_ROLLUP_TABLE}.sentiment_sum, {COMMENT_ROLLUP_TABLE}.sentiment_count)
+              IS DISTINCT FROM
+              (EXCLUDED.comment_count, EXCLUDED.removed_count, EXCLUDED.sentiment_sum, EXCLUDED.sentiment_count)
+    )"""
+
+# Recompute every bucket from `comments`; comments without a tenant, location or created_date belong to none.
+# A data-modifying WITH runs even though nothing reads it.
+REFRESH_COMMENT_ROLLUP_SQL = f"""
+    WITH fresh AS (
+        SELECT c.tenant_id, c.entity_id, date_trunc('month', c.created_date)::date AS month,{_BUCKET_AGGREGATES}
+        FROM comments c
+        WHERE c.tenant_id IS NOT NULL AND c.entity_id IS NOT NULL AND c.created_date IS NOT NULL
+        GROUP BY 1, 2, 3
+    ),{_UPSERT_FRESH_BUCKETS}
+    DELETE FROM {COMMENT_ROLLUP_TABLE} r
+    WHERE NOT EXISTS (
+        SELECT 1 FROM fresh f
+        WHERE f.tenant_id = r.tenant_id AND f.entity_id = r.entity_id AND f.month = r.month
+    )
+"""
+
+# Claim the recorded buckets and recompute only those. Buckets recorded by loads that commit after this
+# statement started stay in the table for the next refresh.
+REFRESH_DIRTY_BUCKETS_SQL = f"""
+    WITH claimed AS (
+        DELETE FROM {DIRTY_BUCKETS_TABLE} RETURNING tenant_id, entity_id, month
+    ),
+    buckets AS (
+        SELECT DISTINCT tenant_id, entity_id, month FROM claimed
+    ),
+    fresh AS (
+        SELECT b.tenant_id, b.entity_id, b.month,{_BUCKET_AGGREGATES}
+        FROM buckets b
+        JOIN comments c ON c.tenant_id = b.tenant_id AND c.entity_id = b.entity_id
+                       AND c.created_date >= b.month AND c.created_date < b.month + INTERVAL '1 month'
+        GROUP BY b.tenant_id, b.entity_id, b.month
+    ),{_UPSERT_FRESH_BUCKETS}
+    DELETE FROM {COMMENT_ROLLUP_TABLE} r
+    USING buckets b
+    WHERE r.tenant_id = b.tenant_id AND r.entity_id = b.entity_id AND r.month = b.month
+      AND NOT EXISTS (
+          SELECT 1 FROM fresh f
+          WHERE f.tenant_id = r.tenant_id AND f.entity_id = r.entity_id AND f.month = r.month
+      )
+"""
+
+
+def ensure_rollups(cur):
+    """
+    Create the rollup table, views and bucket-recording triggers on `comments` if they are missing, and the
+    comments (entity_id, created_date) index a refresh uses to find the comments of a bucket.
+
+    Installing the triggers also computes the rollup from the comments already loaded, so the recorded
+    buckets only ever have to cover later changes. Call it before loading comments (once up front when
+    several loaders run at the same time), or the buckets of that load are not recorded, and commit it on its
+    own: creating a missing object takes locks that should not be held through a load or a refresh.
+    """
+    for name, kind, ddl in ROLLUP_OBJECTS:
+        cur.execute(f"SELECT to_{kind}(%s) IS NULL", (name,))
+        if cur.fetchone()[0]:
+            cur.execute(ddl)
+    cur.execute(EXISTING_TRIGGERS_SQL)
+    existing = {row[0] for row in cur.fetchall()}
+    missing = [name for name in ROLLUP_TRIGGERS if name not in existing]
+    for name in missing:
+        cur.execute(f"CREATE TRIGGER {name} {ROLLUP_TRIGGERS[name]}")
+    if missing:
+        cur.execute(LOCK_ROLLUP_SQL)
+        cur.execute(REFRESH_COMMENT_ROLLUP_SQL)
+
+
+def refresh_comment_rollups(cur, full=False):
+    """
+    Bring the rollup up to date: recompute the buckets recorded since the last refresh, or every bucket.
+
+    Expects ensure_rollups to have run (and committed) already; the refresh itself only takes the advisory
+    lock that serializes refreshes. Also bumps the comments data version, so results cached from the rollup
+    before the refresh are dropped; callers need no separate bump for comments. Call before conn.commit().
+    """
+    cur.execute(LOCK_ROLLUP_SQL)
+    if full:
+        cur.execute(f"DELETE FROM {DIRTY_BUCKETS_TABLE}")
+        cur.execute(REFRESH_COMMENT_ROLLUP_SQL)
+    else:
+        cur.execute(REFRESH_DIRTY_BUCKETS_SQL)
+    bump_data_version(cur, COMMENTS_TABLE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install and refresh the comment rollups.")
+    parser.add_argument('--full', action='store_true',
+                        help="Recompute every bucket instead of the buckets recorded since the last refresh.")
+    args = parser.parse_args()
+
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            ensure_rollups(cur)
+        conn.commit()
+        with conn.cursor() as cur:
+            refresh_comment_rollups(cur, full=args.full)
+            cur.execute(f"SELECT COUNT(*) FROM {COMMENT_ROLLUP_TABLE}")
+            buckets = cur.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Refreshed {COMMENT_ROLLUP_TABLE}: {buckets} (tenant, location, month) buckets.")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,10 @@ from dotenv import load_dotenv, find_dotenv
 import os
 
 from vanna.flask import VannaFlaskApp # Import VannaFlaskApp
+from flask import jsonify
+from vanna_cache import ResultCacheMixin, SemanticCacheMixin, TrainedQuestionIndexMixin
+from vanna_postgres_pool import PostgresPoolMixin
+from vanna_metrics import LatencyInstrumentationMixin, install_flask_metrics
 
 # --- Manual .env Parsing and DB Environment Variable Setting (Copy from vanna_train.py) ---
 # This part is copied from vanna_train.py to ensure DB credentials are set correctly
@@ -117,15 +121,18 @@ qdrant_client_instance = QdrantClient(
     api_key=qdrant_api_key,
 )
 
-collection_name = "vanna_testing"
+# Same collections vanna_train.py trains into
+documentation_collection_name = "vanna_documentation"
+ddl_collection_name = "vanna_ddl"
+sql_collection_name = "vanna_sql"
 
-class MyVanna(Qdrant_VectorStore, OpenAI_Chat):
+class MyVanna(LatencyInstrumentationMixin, TrainedQuestionIndexMixin, SemanticCacheMixin, ResultCacheMixin, PostgresPoolMixin, Qdrant_VectorStore, OpenAI_Chat):
     def __init__(self, config=None):
         Qdrant_VectorStore.__init__(self, config={
             'client': config['client'],
-            'documentation_collection_name': collection_name,
-            'ddl_collection_name': collection_name,
-            'sql_collection_name': collection_name,
+            'documentation_collection_name': documentation_collection_name,
+            'ddl_collection_name': ddl_collection_name,
+            'sql_collection_name': sql_collection_name,
         })
         OpenAI_Chat.__init__(self, config=config)
 
@@ -134,11 +141,27 @@ vn = MyVanna(config={
     'api_key': openai_api_key,
     'model': 'gpt-4o-mini',
     'allow_llm_to_see_data': True,
+    # Semantic answer cache: reuse the SQL of a similar, already answered question without calling the LLM
+    'semantic_cache_threshold': float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95')),
+    'semantic_cache_max_entries': int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000')),
+    'semantic_cache_ttl_seconds': float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', '86400')),
+    # Query result cache, invalidated when the upload scripts bump the data version
+    'result_cache_max_bytes': int(os.getenv('RESULT_CACHE_MAX_MB', '256')) * 1024 * 1024,
+    'result_cache_version_check_seconds': float(os.getenv('RESULT_CACHE_VERSION_CHECK_SECONDS', '5')),
+    # How often the Qdrant collections are checked for training done by vanna_train.py
+    'training_version_check_seconds': float(os.getenv('TRAINING_VERSION_CHECK_SECONDS', '60')),
 })
 
 print("\n--- Debug: Vanna Instance Configuration ---")
 print("------------------------------------------")
 
+# Load the trained question/SQL pairs so exact matches are answered without the LLM
+try:
+    trained_question_count = vn.rebuild_question_index()
+    print(f"Loaded {trained_question_count} trained questions into the exact-match index.")
+except Exception as e:
+    print(f"Warning: could not load the trained question index, every question will go to the LLM: {e}")
+
 # Load database credentials from environment variables
 db_host = os.getenv('DB_HOST')
 db_dbname = os.getenv('DB_NAME')
@@ -168,7 +191,17 @@ else:
         else:
              print("Warning: DB_PORT not set or is not a valid integer. Attempting connection without explicit port.")
 
-        vn.connect_to_postgres(**connection_params)
+        # Pooled runner: connections are reused across requests instead of opened per query
+        vn.connect_to_postgres_pool(
+            **connection_params,
+            min_size=int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+            max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            statement_timeout_ms=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000')),
+        )
+        # Wrap run_sql so repeated queries are answered from memory until the next data load
+        vn.enable_result_cache()
+        # Time SQL execution for the per-stage latency histograms
+        vn.instrument_run_sql()
         print("\nSuccessfully connected to the Postgres database for the Vanna API.")
     except Exception as e:
         print(f"Error connecting to the database for the Vanna API: {e}")
@@ -182,6 +215,32 @@ try:
     print("\nStarting Vanna Flask App...")
     # NOTE: The Vanna instance is now trained on the locations and comments tables as well, due to the updated vanna_train.py training logic.
     app = VannaFlaskApp(vn)
+
+    @app.flask_app.route("/api/v0/cache_stats", methods=["GET"])
+    def cache_stats():
+        return jsonify({
+            'question_index': vn.question_index_stats(),
+            'semantic_cache': vn.semantic_cache_stats(),
+            'result_cache': vn.result_cache_stats(),
+        })
+
+    @app.flask_app.route("/api/v0/pool_stats", methods=["GET"])
+    def pool_stats():
+        return jsonify(vn.pool_stats())
+
+    # Per-stage latency histograms plus cache/pool gauges at GET /metrics
+    install_flask_metrics(
+        app.flask_app,
+        vn,
+        gauges={
+            'vanna_pool': vn.pool_stats,
+            'vanna_question_index': vn.question_index_stats,
+            'vanna_semantic_cache': vn.semantic_cache_stats,
+            'vanna_result_cache': vn.result_cache_stats,
+        },
+        trace_log=os.getenv('VANNA_TRACE_LOG', '').lower() in ('1', 'true', 'yes'),
+    )
+
     app.run() # This will block, running the web server
 except Exception as e:
     print(f"Error running Vanna Flask App: {e}")
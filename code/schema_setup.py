@@ -0,0 +1,44 @@
+# code/schema_setup.py
+# Managed schema setup: creates the locations and comments tables, their secondary indexes
+# (db_schema.INDEX_DDL), the data-version table and the comment rollups. Every statement is idempotent, so it
+# can run against a fresh or an existing database, e.g. on every deploy.
+#
+# The table DDL is the one trained into Vanna (vanna_training_data.py), and the index DDL is trained too, so the
+# model knows which joins and filters are indexed.
+#
+# Usage (from the project root, after setup_postgres_project.sh created the database; DB_* settings from .env):
+#   python code/schema_setup.py
+from data_version import ensure_data_version_table
+from db_schema import INDEX_DDL
+from postgres_copy import connect_from_env
+from rollups import ensure_rollups
+from vanna_training_data import comments_ddl, locations_ddl
+
+TABLE_DDL = [locations_ddl, comments_ddl]
+
+
+def ensure_schema(cur):
+    """Create whatever is missing of the tables, indexes, data-version table and comment rollups."""
+    for ddl in TABLE_DDL:
+        cur.execute(ddl.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+    for ddl in INDEX_DDL:
+        cur.execute(ddl)
+    ensure_data_version_table(cur)
+    # After the tables: the rollup triggers are created on comments
+    ensure_rollups(cur)
+
+
+def main():
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cur:
+            ensure_schema(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Schema is up to date: locations, comments, {len(INDEX_DDL)} secondary indexes, data versions and "
+          f"comment rollups.")
+
+
+if __name__ == '__main__':
+    main()
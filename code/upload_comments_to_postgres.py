@@ -1,38 +1,25 @@
 import os
-import psycopg2
-from psycopg2 import sql
 from dotenv import load_dotenv
+from postgres_loader import load_csv
 
 # Load environment variables from .env
 load_dotenv()
 
-DB_NAME = os.getenv('DB_NAME')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_PORT = os.getenv('DB_PORT', '5432')
-
 CSV_PATH = 'data/comments.csv'  # Adjust path if needed
+# Parallel COPY connections and approximate chunk size; see postgres_loader.py
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', '4'))
+LOAD_CHUNK_MB = float(os.getenv('LOAD_CHUNK_MB', '64'))
+# 'upsert' merges into the existing rows instead of failing on the primary key, for reloads and daily deltas
+LOAD_MODE = os.getenv('LOAD_MODE', 'append')
+# Drop secondary indexes for the load and rebuild them afterwards; the table is ANALYZEd either way
+LOAD_REBUILD_INDEXES = os.getenv('LOAD_REBUILD_INDEXES', '').lower() in ('1', 'true', 'yes')
 
 try:
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
-    cur = conn.cursor()
-    with open(CSV_PATH, 'r') as f:
-        # Use copy_expert for more control (handles headers)
-        copy_sql = '''
-            COPY comments(tenant_id, entity_id, comment_id, text, created_date, location_updated_date, overall_sentiment_score, text_language, removed)
-            FROM STDIN WITH CSV HEADER DELIMITER AS ','
-        '''
-        cur.copy_expert(sql=copy_sql, file=f)
-    conn.commit()
-    print(f"Successfully uploaded {CSV_PATH} to the comments table.")
-    cur.close()
-    conn.close()
+    # Chunks commit one by one; rerunning after a failure resumes from the last committed chunk
+    summary = load_csv('comments', CSV_PATH, workers=LOAD_WORKERS, chunk_mb=LOAD_CHUNK_MB, mode=LOAD_MODE,
+                       rebuild_indexes=LOAD_REBUILD_INDEXES)
+    print(f"Successfully uploaded {CSV_PATH} to the comments table "
+          f"({summary['rows_loaded']} rows, {summary['rows_per_second']} rows/s).")
+    print("Phase timings: " + ", ".join(f"{phase} {seconds}s" for phase, seconds in summary['phases'].items()))
 except Exception as e:
-    print(f"Error uploading CSV to Postgres: {e}") 
\ No newline at end of file
+    print(f"Error uploading CSV to Postgres: {e}")
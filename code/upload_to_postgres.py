@@ -2,6 +2,7 @@ import os
 import psycopg2
 from psycopg2 import sql
 from dotenv import load_dotenv
+from rollups import ensure_rollups, refresh_comment_rollups
 
 # Load environment variables from .env
 load_dotenv()
@@ -23,6 +24,9 @@ try:
         port=DB_PORT
     )
     cur = conn.cursor()
+    # Rollup tables and triggers first, committed on their own so the DDL stays out of the load transaction
+    ensure_rollups(cur)
+    conn.commit()
     with open(CSV_PATH, 'r') as f:
         # Use copy_expert for more control (handles headers)
         copy_sql = '''
@@ -30,6 +34,9 @@ try:
             FROM STDIN WITH CSV HEADER DELIMITER AS ','
         '''
         cur.copy_expert(sql=copy_sql, file=f)
+    # Recompute the rollup buckets the rows touched and bump the data version in the same transaction, so the
+    # rollups and the API's result cache never lag behind the comments
+    refresh_comment_rollups(cur)
     conn.commit()
     print(f"Successfully uploaded {CSV_PATH} to the comments table.")
     cur.close()
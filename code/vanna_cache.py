@@ -0,0 +1,531 @@
+# code/vanna_cache.py
+# Caches and fast paths for the MyVanna instance served by run_vanna_api.py.
+#
+# The classes here are mixins: list them ahead of Qdrant_VectorStore / OpenAI_Chat, e.g.
+#   class MyVanna(SemanticCacheMixin, Qdrant_VectorStore, OpenAI_Chat)
+# Their settings are read from the Vanna config dict on first use.
+# Order matters: TrainedQuestionIndexMixin goes first so exact matches skip the semantic cache lookup too.
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from data_version import get_data_version_token
+from vanna_training import API_ADDED_PAYLOAD, get_stored_point_ids
+
+# Default settings, overridable through the Vanna config dict
+DEFAULT_SEMANTIC_CACHE_THRESHOLD = 0.95
+DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES = 1000
+DEFAULT_SEMANTIC_CACHE_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# How often (seconds) the data-version token is re-read from Postgres; 0 checks on every query
+DEFAULT_RESULT_CACHE_VERSION_CHECK_SECONDS = 5.0
+# Page size used when scrolling the trained question/SQL pairs out of the SQL collection
+QUESTION_INDEX_SCROLL_SIZE = 1000
+# How often (seconds) the training collections are checked for changes made by another process (vanna_train.py);
+# 0 checks before every question
+DEFAULT_TRAINING_VERSION_CHECK_SECONDS = 60.0
+# Recent texts whose embeddings are kept, so one question is embedded once per request
+# instead of once for the cache lookup and once per Qdrant search
+EMBEDDING_MEMO_SIZE = 256
+
+
+# Numbers and quoted values in a question ("more than 10 stars", "in 'Berlin'"); an apostrophe inside a word
+# such as "tenant's" does not open a quote
+QUESTION_LITERAL = re.compile(r"(?<!\w)'[^']*'(?!\w)|\"[^\"]*\"|\d+(?:[.,]\d+)*")
+
+
+def normalize_question(question):
+    # Case, whitespace and punctuation insensitive form used as the trained question index key
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def question_literals(question):
+    # Sorted numbers and quoted values of a question; similar questions with different ones need different SQL
+    return tuple(sorted(literal.lower() for literal in QUESTION_LITERAL.findall(question)))
+
+
+class TrainedQuestionIndexMixin:
+    """
+    Answer questions that match a trained question with the trained SQL, skipping LLM generation.
+
+    The index maps normalize_question(question) -> sql and is held in memory. Call
+    rebuild_question_index() at startup to load it from the SQL collection; add_question_sql and
+    remove_training_data keep it current afterwards. Training done by another process is picked up through
+    training_version_token(), checked every 'training_version_check_seconds' (config, default 60): when it
+    changes, the index is rebuilt and on_training_changed() (e.g. SemanticCacheMixin's) is called.
+    Pairs added here are marked with vanna_training.API_ADDED_PAYLOAD, so incremental training keeps them.
+    """
+
+    _question_index_init_lock = threading.Lock()
+
+    def _ensure_question_index(self):
+        if getattr(self, '_question_index', None) is None:
+            with self._question_index_init_lock:
+                if getattr(self, '_question_index', None) is None:
+                    self._question_index_lock = threading.Lock()
+                    self._question_index = {}
+                    self.question_index_hits = 0
+                    self.question_index_misses = 0
+                    self._training_check_lock = threading.Lock()
+                    self._training_token = None
+                    self._training_checked_at = 0.0
+        return self._question_index
+
+    def training_version_token(self):
+        # Point ids are content fingerprints (see vanna_training.py), so any added, edited or removed item
+        # changes the token
+        return hash(tuple(
+            frozenset(get_stored_point_ids(self._client, collection_name, include_api_added=True))
+            for collection_name in (self.ddl_collection_name, self.documentation_collection_name,
+                                    self.sql_collection_name)
+        ))
+
+    def check_training_version(self):
+        self._ensure_question_index()
+        config = self.config or {}
+        check_seconds = float(config.get('training_version_check_seconds', DEFAULT_TRAINING_VERSION_CHECK_SECONDS))
+        now = time.monotonic()
+        if now - self._training_checked_at < check_seconds:
+            return
+        # One thread checks; the others keep answering from the current index meanwhile
+        if not self._training_check_lock.acquire(blocking=False):
+            return
+        try:
+            self._training_checked_at = now
+            if self.training_version_token() != self._training_token:
+                self.log(title="Training data changed", message="Rebuilding the trained question index")
+                self.rebuild_question_index()
+                on_training_changed = getattr(self, 'on_training_changed', None)
+                if on_training_changed is not None:
+                    on_training_changed()
+        except Exception as e:
+            self.log(title="Training version check failed", message=str(e))
+        finally:
+            self._training_check_lock.release()
+
+    def rebuild_question_index(self):
+        self._ensure_question_index()
+        # Taken before the scroll, so changes made while it runs are picked up by the next check
+        token = self.training_version_token()
+        index = {}
+        next_offset = None
+        while True:
+            records, next_offset = self._client.scroll(
+                collection_name=self.sql_collection_name,
+                limit=QUESTION_INDEX_SCROLL_SIZE,
+                offset=next_offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for record in records:
+                payload = record.payload or {}
+                if payload.get('question') and payload.get('sql'):
+                    index[normalize_question(payload['question'])] = payload['sql']
+            if next_offset is None:
+                break
+
+        with self._question_index_lock:
+            self._question_index = index
+        self._training_token = token
+        self._training_checked_at = time.monotonic()
+        return len(index)
+
+    def lookup_trained_sql(self, question):
+        index = self._ensure_question_index()
+        with self._question_index_lock:
+            sql = index.get(normalize_question(question))
+            if sql is None:
+                self.question_index_misses += 1
+            else:
+                self.question_index_hits += 1
+            return sql
+
+    def generate_sql(self, question, allow_llm_to_see_data=False, **kwargs):
+        self.check_training_version()
+        sql = self.lookup_trained_sql(question)
+        if sql is not None:
+            self.log(title="Trained question match", message=question)
+            return sql
+        return super().generate_sql(question=question, allow_llm_to_see_data=allow_llm_to_see_data, **kwargs)
+
+    def add_question_sql(self, question, sql, **kwargs):
+        point_id = super().add_question_sql(question, sql, **kwargs)
+        # Point ids are returned as "<uuid>-sql"
+        self._client.set_payload(collection_name=self.sql_collection_name, payload=API_ADDED_PAYLOAD,
+                                 points=[point_id.rsplit('-', 1)[0]])
+        self._ensure_question_index()
+        with self._question_index_lock:
+            self._question_index[normalize_question(question)] = sql
+        return point_id
+
+    def remove_training_data(self, id, **kwargs):
+        removed = super().remove_training_data(id, **kwargs)
+        if removed and id.endswith("-sql"):
+            self.rebuild_question_index()
+        return removed
+
+    def question_index_stats(self):
+        index = self._ensure_question_index()
+        with self._question_index_lock:
+            return {
+                'size': len(index),
+                'hits': self.question_index_hits,
+                'misses': self.question_index_misses,
+            }
+
+
+class SemanticCache:
+    """
+    Question-embedding -> SQL cache with LRU and TTL eviction.
+
+    A lookup returns the SQL of the most similar cached question whose cosine similarity is at least
+    `threshold` and whose numbers and quoted values are the same as the asked question's, since the cached SQL
+    is returned as it is. Thread-safe, since the Flask app serves requests from several threads.
+    """
+
+    def __init__(self, threshold=DEFAULT_SEMANTIC_CACHE_THRESHOLD, max_entries=DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_SEMANTIC_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # question -> (unit embedding, sql, created_at, literals), oldest first
+        # Stacked embeddings and the question of each row, rebuilt lazily after an add or expiry. A hit only
+        # reorders _entries, so the rows need not follow the LRU order.
+        self._matrix = None
+        self._keys = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.literal_mismatches = 0
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _expire(self, now):
+        expired = [question for question, entry in self._entries.items() if now - entry[2] > self.ttl_seconds]
+        for question in expired:
+            del self._entries[question]
+        if expired:
+            self.expirations += len(expired)
+            self._matrix = None
+
+    def lookup(self, embedding, question):
+        # Returns (cached question, sql, similarity) for a hit, or None for a miss
+        with self._lock:
+            self._expire(time.time())
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.vstack([entry[0] for entry in self._entries.values()])
+            similarities = self._matrix @ self._unit(embedding)
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            if not len(candidates):
+                self.misses += 1
+                return None
+
+            # Most similar first; skip questions that only differ in a number or quoted value
+            literals = question_literals(question)
+            for row in candidates[np.argsort(-similarities[candidates], kind='stable')]:
+                cached_question = self._keys[row]
+                if self._entries[cached_question][3] == literals:
+                    self._entries.move_to_end(cached_question)  # mark as most recently used
+                    self.hits += 1
+                    return cached_question, self._entries[cached_question][1], float(similarities[row])
+            self.literal_mismatches += 1
+            self.misses += 1
+            return None
+
+    def add(self, question, embedding, sql):
+        with self._lock:
+            self._entries[question] = (self._unit(embedding), sql, time.time(), question_literals(question))
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'literal_mismatches': self.literal_mismatches,
+            }
+
+
+class SemanticCacheMixin:
+    """
+    Reuse the SQL of a previously answered, semantically similar question instead of calling the LLM.
+
+    A hit needs the same numbers and quoted values as the cached question, and the cache is cleared whenever
+    training data is added or removed, through this instance or (with TrainedQuestionIndexMixin) elsewhere.
+
+    Config keys: 'semantic_cache_threshold' (cosine similarity, default 0.95),
+    'semantic_cache_max_entries' (default 1000) and 'semantic_cache_ttl_seconds' (default 24h).
+    """
+
+    _semantic_cache_init_lock = threading.Lock()
+
+    @property
+    def semantic_cache(self):
+        return self._ensure_semantic_cache()
+
+    def _ensure_semantic_cache(self):
+        # Created lazily because MyVanna.__init__ calls the base class initializers explicitly
+        if getattr(self, '_semantic_cache', None) is None:
+            with self._semantic_cache_init_lock:
+                if getattr(self, '_semantic_cache', None) is None:
+                    config = self.config or {}
+                    self._semantic_cache = SemanticCache(
+                        threshold=float(config.get('semantic_cache_threshold', DEFAULT_SEMANTIC_CACHE_THRESHOLD)),
+                        max_entries=int(config.get('semantic_cache_max_entries', DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES)),
+                        ttl_seconds=float(config.get('semantic_cache_ttl_seconds', DEFAULT_SEMANTIC_CACHE_TTL_SECONDS)),
+                    )
+        return self._semantic_cache
+
+    def _ensure_embedding_memo(self):
+        # Separate from the cache itself: Qdrant_VectorStore.__init__ may embed before the full config is set
+        if getattr(self, '_embedding_memo', None) is None:
+            with self._semantic_cache_init_lock:
+                if getattr(self, '_embedding_memo', None) is None:
+                    self._embedding_memo_lock = threading.Lock()
+                    self._embedding_memo = OrderedDict()
+
+    def generate_embedding(self, data, **kwargs):
+        # Memoize recent embeddings: the cache lookup and the three Qdrant searches all embed the same question
+        self._ensure_embedding_memo()
+        with self._embedding_memo_lock:
+            if data in self._embedding_memo:
+                self._embedding_memo.move_to_end(data)
+                return self._embedding_memo[data]
+        embedding = super().generate_embedding(data, **kwargs)
+        with self._embedding_memo_lock:
+            self._embedding_memo[data] = embedding
+            while len(self._embedding_memo) > EMBEDDING_MEMO_SIZE:
+                self._embedding_memo.popitem(last=False)
+        return embedding
+
+    def generate_sql(self, question, allow_llm_to_see_data=False, **kwargs):
+        embedding = self.generate_embedding(question)
+        cached = self.semantic_cache.lookup(embedding, question)
+        if cached is not None:
+            cached_question, sql, similarity = cached
+            self.log(title="Semantic cache hit", message=f"'{question}' ~ '{cached_question}' ({similarity:.3f})")
+            return sql
+
+        sql = super().generate_sql(question=question, allow_llm_to_see_data=allow_llm_to_see_data, **kwargs)
+        # Only remember answers that are actually SQL, not LLM explanations or errors
+        if sql and self.is_sql_valid(sql):
+            self.semantic_cache.add(question, embedding, sql)
+        return sql
+
+    def on_training_changed(self):
+        # Cached SQL was generated from the training data of its time, so any training change drops it. Also
+        # called by TrainedQuestionIndexMixin when another process changed the training collections.
+        self.semantic_cache.clear()
+
+    def add_question_sql(self, question, sql, **kwargs):
+        point_id = super().add_question_sql(question, sql, **kwargs)
+        self.on_training_changed()
+        return point_id
+
+    def add_ddl(self, ddl, **kwargs):
+        point_id = super().add_ddl(ddl, **kwargs)
+        self.on_training_changed()
+        return point_id
+
+    def add_documentation(self, documentation, **kwargs):
+        point_id = super().add_documentation(documentation, **kwargs)
+        self.on_training_changed()
+        return point_id
+
+    def remove_training_data(self, id, **kwargs):
+        removed = super().remove_training_data(id, **kwargs)
+        if removed:
+            self.on_training_changed()
+        return removed
+
+    def semantic_cache_stats(self):
+        return self.semantic_cache.stats()
+
+
+# Quoted parts of a statement: string literals, quoted identifiers and dollar-quoted strings
+SQL_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(\w*)\$.*?\$\1\$", re.DOTALL)
+# Keywords of statements that write or lock (also inside a SELECT or WITH, e.g. a data-modifying CTE or
+# SELECT ... INTO) and functions whose result changes without a load. Results of such statements are not cached.
+UNCACHEABLE_SQL = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE|TRUNCATE|CREATE|DROP|ALTER|GRANT|REVOKE|COPY|CALL|LOCK|INTO|SHARE"
+    r"|NOW|RANDOM|SETSEED|CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|LOCALTIME|LOCALTIMESTAMP|CLOCK_TIMESTAMP"
+    r"|STATEMENT_TIMESTAMP|TRANSACTION_TIMESTAMP|TIMEOFDAY|GEN_RANDOM_UUID|UUID_GENERATE_\w+|NEXTVAL|SETVAL"
+    r"|PG_SLEEP)\b",
+    re.IGNORECASE,
+)
+_sql_whitespace = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    # Whitespace-insensitive cache key; whitespace inside quoted literals and identifiers is kept, since it
+    # changes the statement's meaning
+    parts = []
+    position = 0
+    for match in SQL_QUOTED.finditer(sql):
+        parts.append(_sql_whitespace.sub(" ", sql[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_sql_whitespace.sub(" ", sql[position:]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_cacheable_sql(sql):
+    # Plain reads only: a SELECT or WITH statement without write keywords or volatile functions outside literals
+    unquoted = SQL_QUOTED.sub(" ", sql)
+    first_word = unquoted.split(None, 1)[:1]
+    if not first_word or first_word[0].upper() not in ('SELECT', 'WITH'):
+        return False
+    return UNCACHEABLE_SQL.search(unquoted) is None
+
+
+class ResultCache:
+    """
+    Normalized SQL -> result DataFrame cache bounded by an approximate memory budget.
+
+    Entries are tagged with the data-version token current when they were stored; a token change
+    (any upload script run) invalidates everything. Least recently used entries are evicted until the
+    total DataFrame size fits in `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.version_token = None
+        self._entries = OrderedDict()  # normalized sql -> (DataFrame, size in bytes), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def set_version(self, token):
+        with self._lock:
+            if token != self.version_token:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.total_bytes = 0
+                self.version_token = token
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Shallow copy so callers adding columns do not change the cached frame
+            return entry[0].copy(deep=False)
+
+    def put(self, key, df, token):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            # Skip results from before an invalidation and results that would never fit
+            if token != self.version_token or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'version_token': self.version_token,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class ResultCacheMixin:
+    """
+    Cache query results of run_sql, invalidated by the data-version token the upload scripts bump.
+
+    connect_to_postgres sets run_sql on the instance, so call enable_result_cache() after connecting.
+    Config keys: 'result_cache_max_bytes' (default 256 MB) and 'result_cache_version_check_seconds'
+    (default 5; results may be served that long after a load commits).
+    """
+
+    def enable_result_cache(self):
+        config = self.config or {}
+        self.result_cache = ResultCache(
+            max_bytes=int(config.get('result_cache_max_bytes', DEFAULT_RESULT_CACHE_MAX_BYTES)),
+        )
+        version_check_seconds = float(config.get('result_cache_version_check_seconds',
+                                                 DEFAULT_RESULT_CACHE_VERSION_CHECK_SECONDS))
+        uncached_run_sql = self.run_sql
+        version_lock = threading.Lock()
+        last_version_check = [0.0]
+
+        def refresh_version():
+            with version_lock:
+                now = time.monotonic()
+                if now - last_version_check[0] < version_check_seconds and self.result_cache.version_token is not None:
+                    return self.result_cache.version_token
+                token = get_data_version_token(uncached_run_sql)
+                self.result_cache.set_version(token)
+                last_version_check[0] = now
+                return token
+
+        def run_sql_cached(sql, **kwargs):
+            if not is_cacheable_sql(sql):
+                return uncached_run_sql(sql, **kwargs)
+
+            key = normalize_sql(sql)
+            token = refresh_version()
+            df = self.result_cache.get(key)
+            if df is not None:
+                return df
+            df = uncached_run_sql(sql, **kwargs)
+            if df is not None:
+                self.result_cache.put(key, df, token)
+            return df
+
+        self.run_sql = run_sql_cached
+
+    def result_cache_stats(self):
+        cache = getattr(self, 'result_cache', None)
+        return cache.stats() if cache is not None else {}
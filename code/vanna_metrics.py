@@ -0,0 +1,256 @@
+# code/vanna_metrics.py
+# Per-stage latency instrumentation for the ask pipeline served by run_vanna_api.py.
+#
+# LatencyInstrumentationMixin times each stage of a request (question embedding, the three Qdrant searches,
+# prompt assembly, the LLM completion, SQL execution and Plotly generation) and records them in histograms.
+# Stage times are exclusive: the embedding done inside a Qdrant search is counted as 'embedding', not as
+# part of the search. install_flask_metrics() adds a Prometheus-style /metrics endpoint and an optional
+# structured trace line per request.
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent samples kept per stage for percentile estimates
+MAX_SAMPLES_PER_STAGE = 10000
+
+# Per-thread stack of open stages and the trace of the request currently handled by the thread
+_trace_state = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = []
+        self._next_sample = 0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, upper in enumerate(self.buckets):
+            if seconds <= upper:
+                self.bucket_counts[i] += 1
+                break
+        # Ring buffer of recent samples for percentiles
+        if len(self.samples) < MAX_SAMPLES_PER_STAGE:
+            self.samples.append(seconds)
+        else:
+            self.samples[self._next_sample] = seconds
+            self._next_sample = (self._next_sample + 1) % MAX_SAMPLES_PER_STAGE
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+class LatencyMetrics:
+    """Thread-safe registry of per-stage latency histograms."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def summary(self):
+        # stage -> count, mean and p50/p95/p99 in milliseconds
+        with self._lock:
+            return {
+                stage: {
+                    'count': histogram.count,
+                    'mean_ms': round(1000 * histogram.sum / histogram.count, 3) if histogram.count else None,
+                    'p50_ms': _to_ms(histogram.percentile(50)),
+                    'p95_ms': _to_ms(histogram.percentile(95)),
+                    'p99_ms': _to_ms(histogram.percentile(99)),
+                }
+                for stage, histogram in sorted(self._histograms.items())
+            }
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP vanna_stage_latency_seconds Exclusive time spent in each stage of the ask pipeline.",
+            "# TYPE vanna_stage_latency_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for upper, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'vanna_stage_latency_seconds_bucket{{stage="{stage}",le="{upper}"}} {cumulative}')
+                lines.append(f'vanna_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'vanna_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'vanna_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+def _to_ms(seconds):
+    return round(1000 * seconds, 3) if seconds is not None else None
+
+
+def render_gauges(prefix, values):
+    # Numeric entries of a stats dict (e.g. vn.pool_stats()) as Prometheus gauges
+    lines = []
+    for name, value in sorted(values.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def start_trace():
+    _trace_state.trace = {}
+    _trace_state.stack = []
+
+
+def finish_trace():
+    trace = getattr(_trace_state, 'trace', None)
+    _trace_state.trace = None
+    return trace or {}
+
+
+class LatencyInstrumentationMixin:
+    """
+    Time each stage of the ask pipeline. List it first among MyVanna's bases so it wraps every other mixin.
+
+    connect_to_postgres(_pool) sets run_sql on the instance, so call instrument_run_sql() after connecting
+    (and after enable_result_cache, so 'sql_execution' includes result cache hits).
+    """
+
+    _latency_metrics_init_lock = threading.Lock()
+
+    @property
+    def latency_metrics(self):
+        if getattr(self, '_latency_metrics', None) is None:
+            with self._latency_metrics_init_lock:
+                if getattr(self, '_latency_metrics', None) is None:
+                    self._latency_metrics = LatencyMetrics()
+        return self._latency_metrics
+
+    @contextmanager
+    def time_stage(self, stage):
+        stack = getattr(_trace_state, 'stack', None)
+        if stack is None:
+            stack = _trace_state.stack = []
+        frame = [0.0]  # time spent in nested stages
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            exclusive = elapsed - frame[0]
+            self.latency_metrics.observe(stage, exclusive)
+            trace = getattr(_trace_state, 'trace', None)
+            if trace is not None:
+                trace[stage] = trace.get(stage, 0.0) + exclusive
+
+    def instrument_run_sql(self):
+        timed_run_sql = self.run_sql
+
+        def run_sql_timed(sql, **kwargs):
+            with self.time_stage('sql_execution'):
+                return timed_run_sql(sql, **kwargs)
+
+        self.run_sql = run_sql_timed
+
+    def generate_embedding(self, data, **kwargs):
+        with self.time_stage('embedding'):
+            return super().generate_embedding(data, **kwargs)
+
+    def get_similar_question_sql(self, question, **kwargs):
+        with self.time_stage('qdrant_sql_search'):
+            return super().get_similar_question_sql(question, **kwargs)
+
+    def get_related_ddl(self, question, **kwargs):
+        with self.time_stage('qdrant_ddl_search'):
+            return super().get_related_ddl(question, **kwargs)
+
+    def get_related_documentation(self, question, **kwargs):
+        with self.time_stage('qdrant_documentation_search'):
+            return super().get_related_documentation(question, **kwargs)
+
+    def get_sql_prompt(self, *args, **kwargs):
+        with self.time_stage('prompt_assembly'):
+            return super().get_sql_prompt(*args, **kwargs)
+
+    def submit_prompt(self, prompt, **kwargs):
+        with self.time_stage('llm_completion'):
+            return super().submit_prompt(prompt, **kwargs)
+
+    def generate_sql(self, question, allow_llm_to_see_data=False, **kwargs):
+        # Whatever generate_sql spends outside the stages above (cache lookups, response parsing)
+        with self.time_stage('generate_sql_overhead'):
+            return super().generate_sql(question=question, allow_llm_to_see_data=allow_llm_to_see_data, **kwargs)
+
+    def generate_plotly_code(self, *args, **kwargs):
+        with self.time_stage('plotly_code'):
+            return super().generate_plotly_code(*args, **kwargs)
+
+    def get_plotly_figure(self, *args, **kwargs):
+        with self.time_stage('plotly_figure'):
+            return super().get_plotly_figure(*args, **kwargs)
+
+
+def install_flask_metrics(flask_app, vn, gauges=None, trace_log=False):
+    """
+    Register per-request tracing and a GET /metrics endpoint on `flask_app`.
+
+    `gauges` maps a metric prefix to a callable returning a stats dict, e.g. {'vanna_pool': vn.pool_stats};
+    its numeric entries are exported as gauges. With `trace_log=True` one JSON line with the stage timings
+    is printed per request.
+    """
+    gauges = gauges or {}
+
+    @flask_app.before_request
+    def _start_request_trace():
+        start_trace()
+        g.vanna_request_started = time.perf_counter()
+
+    @flask_app.after_request
+    def _finish_request_trace(response):
+        started = g.pop('vanna_request_started', None)
+        trace = finish_trace()
+        if started is not None and request.path != '/metrics':
+            total = time.perf_counter() - started
+            vn.latency_metrics.observe('request_total', total)
+            if trace_log and trace:
+                print(json.dumps({
+                    'event': 'vanna_request',
+                    'path': request.path,
+                    'status': response.status_code,
+                    'total_ms': round(1000 * total, 3),
+                    'stages_ms': {stage: round(1000 * seconds, 3) for stage, seconds in trace.items()},
+                }))
+        return response
+
+    @flask_app.route("/metrics", methods=["GET"])
+    def metrics():
+        body = vn.latency_metrics.render_prometheus()
+        for prefix, stats in gauges.items():
+            try:
+                body += render_gauges(prefix, stats())
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+        return Response(body, mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,173 @@
+# code/vanna_postgres_pool.py
+# Pooled Postgres runner for the MyVanna instance served by run_vanna_api.py.
+#
+# Vanna's connect_to_postgres opens a new connection for every run_sql call. PostgresPoolMixin keeps a
+# bounded pool of connections instead, so concurrent API requests reuse them and can never open more
+# than the configured maximum.
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2 import pool
+from vanna.exceptions import ValidationError
+
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_STATEMENT_TIMEOUT_MS = 30000
+# Seconds a request waits for a free connection before giving up
+DEFAULT_CHECKOUT_TIMEOUT = 30.0
+
+
+class PostgresPool:
+    """
+    Thread-safe connection pool with a blocking checkout, per-checkout health check and statement timeout.
+
+    Every checkout runs `SET LOCAL statement_timeout`, which doubles as the health check: a connection that
+    fails it is discarded and replaced. Each checkout ends with a rollback, so no connection is returned to
+    the pool in the middle of a transaction.
+    """
+
+    def __init__(self, min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE,
+                 statement_timeout_ms=DEFAULT_STATEMENT_TIMEOUT_MS, checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 **connection_params):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout_ms = statement_timeout_ms
+        self.checkout_timeout = checkout_timeout
+        self._pool = pool.ThreadedConnectionPool(min_size, max_size, **connection_params)
+        # ThreadedConnectionPool raises instead of waiting when exhausted; the semaphore makes callers queue
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+
+    def _checkout_healthy(self):
+        # Try a couple of pooled connections before giving up; broken ones are closed, not returned
+        last_error = None
+        for _ in range(2):
+            conn = self._pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET LOCAL statement_timeout = %s", (int(self.statement_timeout_ms),))
+                return conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                last_error = e
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self.discarded += 1
+        raise last_error
+
+    @contextmanager
+    def connection(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise pool.PoolError(f"No Postgres connection available within {self.checkout_timeout}s "
+                                     f"(pool max size {self.max_size}).")
+        waited = time.perf_counter() - started
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not broken and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+            with self._lock:
+                self.in_use -= 1
+                if broken:
+                    self.discarded += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'open_connections': len(self._pool._used) + len(self._pool._pool),
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'utilisation': round(self.in_use / self.max_size, 4) if self.max_size else 0.0,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'avg_wait_ms': round(1000 * self.wait_seconds / self.checkouts, 3) if self.checkouts else 0.0,
+                'timeouts': self.timeouts,
+                'discarded_connections': self.discarded,
+                'statement_timeout_ms': self.statement_timeout_ms,
+            }
+
+    def close(self):
+        self._pool.closeall()
+
+
+class PostgresPoolMixin:
+    """
+    Adds connect_to_postgres_pool(), a pooled drop-in replacement for VannaBase.connect_to_postgres.
+    """
+
+    def connect_to_postgres_pool(self, host, dbname, user, password, port=None,
+                                 min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE,
+                                 statement_timeout_ms=DEFAULT_STATEMENT_TIMEOUT_MS,
+                                 checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT, **kwargs):
+        connection_params = {'host': host, 'dbname': dbname, 'user': user, 'password': password, **kwargs}
+        if port is not None:
+            connection_params['port'] = port
+
+        self.postgres_pool = PostgresPool(
+            min_size=min_size,
+            max_size=max_size,
+            statement_timeout_ms=statement_timeout_ms,
+            checkout_timeout=checkout_timeout,
+            **connection_params,
+        )
+
+        def run_sql_postgres_pooled(sql, **kwargs):
+            with self.postgres_pool.connection() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(sql)
+                        if cur.description is None:
+                            return None
+                        return pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    raise
+                except psycopg2.Error as e:
+                    # Same error type connect_to_postgres' runner raises, so the Flask app reports it the same way
+                    raise ValidationError(e)
+
+        self.dialect = "PostgreSQL"
+        self.run_sql = run_sql_postgres_pooled
+        self.run_sql_is_set = True
+
+    def pool_stats(self):
+        postgres_pool = getattr(self, 'postgres_pool', None)
+        return postgres_pool.stats() if postgres_pool is not None else {}
@@ -14,6 +14,8 @@ import random
 from datetime import datetime, timedelta
 from vanna.flask import VannaFlaskApp
 import traceback # Import traceback
+from vanna_training_data import MANUAL_DDL, MANUAL_DOCUMENTATION, MANUAL_QUESTION_SQL
+from vanna_training import BulkTrainingMixin, build_information_schema_query, ensure_collection, parse_name_list
 
 # --- Add code to read .env file content directly and manually parse DB variables ---
 print("\n--- Debug: Reading .env file content directly and manually parsing DB variables ---")
@@ -148,62 +150,100 @@ documentation_collection_name = "vanna_documentation"
 ddl_collection_name = "vanna_ddl"
 sql_collection_name = "vanna_sql"
 
-# --- Add code to delete and recreate the collections with correct dimensions (default vector) ---
-print(f"\nAttempting to delete existing Qdrant collections if they exist...")
-try:
-    qdrant_client_instance.delete_collection(collection_name=documentation_collection_name)
-    print(f"Collection '{documentation_collection_name}' deleted.")
-except Exception as e:
-    print(f"Collection '{documentation_collection_name}' did not exist or could not be deleted: {e}")
+# Training mode: "incremental" (default) keeps the collections and only embeds new/changed items,
+# "full" deletes and recreates the collections and re-embeds everything from scratch.
+train_mode = os.getenv('VANNA_TRAIN_MODE', 'incremental').strip().lower()
+if train_mode not in ('incremental', 'full'):
+    print(f"Error: VANNA_TRAIN_MODE must be 'incremental' or 'full', got '{train_mode}'.")
+    exit(1)
+print(f"\nTraining mode: {train_mode}")
 
-try:
-    qdrant_client_instance.delete_collection(collection_name=ddl_collection_name)
-    print(f"Collection '{ddl_collection_name}' deleted.")
-except Exception as e:
-    print(f"Collection '{ddl_collection_name}' did not exist or could not be deleted: {e}")
+# Bulk training settings: items per embedding/upsert batch, concurrent batches, and retries per call
+train_settings = {}
+for env_name, default in (('VANNA_TRAIN_BATCH_SIZE', '64'), ('VANNA_TRAIN_WORKERS', '4'), ('VANNA_TRAIN_RETRIES', '3')):
+    try:
+        train_settings[env_name] = int(os.getenv(env_name, default))
+    except ValueError:
+        print(f"Error: {env_name} must be an integer, got '{os.getenv(env_name)}'.")
+        exit(1)
+# Schemas and table name patterns (SQL LIKE, comma-separated) included in the generated training plan
+train_schemas = parse_name_list(os.getenv('VANNA_TRAIN_SCHEMAS', 'public'))
+train_include_tables = parse_name_list(os.getenv('VANNA_TRAIN_INCLUDE_TABLES'))
+train_exclude_tables = parse_name_list(os.getenv('VANNA_TRAIN_EXCLUDE_TABLES'))
+if not train_schemas:
+    print("Error: VANNA_TRAIN_SCHEMAS must list at least one schema.")
+    exit(1)
+print(f"Training schemas: {train_schemas}, include tables: {train_include_tables or 'all'}, "
+      f"exclude tables: {train_exclude_tables or 'none'} (plus internal tables)")
+train_batch_size = train_settings['VANNA_TRAIN_BATCH_SIZE']
+train_workers = train_settings['VANNA_TRAIN_WORKERS']
+train_retries = train_settings['VANNA_TRAIN_RETRIES']
+
+if train_mode == 'incremental':
+    print("Ensuring Qdrant collections exist with 384 dimensions (default vector)...")
+    try:
+        for name in (documentation_collection_name, ddl_collection_name, sql_collection_name):
+            ensure_collection(qdrant_client_instance, name, vector_size=384, distance=Distance.COSINE)
+    except Exception as e:
+        print(f"Error ensuring Qdrant collections exist: {e}")
+        exit(1)
+else:
+    # --- Add code to delete and recreate the collections with correct dimensions (default vector) ---
+    print(f"\nAttempting to delete existing Qdrant collections if they exist...")
+    try:
+        qdrant_client_instance.delete_collection(collection_name=documentation_collection_name)
+        print(f"Collection '{documentation_collection_name}' deleted.")
+    except Exception as e:
+        print(f"Collection '{documentation_collection_name}' did not exist or could not be deleted: {e}")
 
-try:
-    qdrant_client_instance.delete_collection(collection_name=sql_collection_name)
-    print(f"Collection '{sql_collection_name}' deleted.")
-except Exception as e:
-    print(f"Collection '{sql_collection_name}' did not exist or could not be deleted: {e}")
+    try:
+        qdrant_client_instance.delete_collection(collection_name=ddl_collection_name)
+        print(f"Collection '{ddl_collection_name}' deleted.")
+    except Exception as e:
+        print(f"Collection '{ddl_collection_name}' did not exist or could not be deleted: {e}")
 
+    try:
+        qdrant_client_instance.delete_collection(collection_name=sql_collection_name)
+        print(f"Collection '{sql_collection_name}' deleted.")
+    except Exception as e:
+        print(f"Collection '{sql_collection_name}' did not exist or could not be deleted: {e}")
 
-print(f"Attempting to recreate Qdrant collections with 384 dimensions (default vector)...")
-try:
-    qdrant_client_instance.recreate_collection(
-        collection_name=documentation_collection_name,
-        vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-    )
-    print(f"Collection '{documentation_collection_name}' recreated successfully with 384 dimensions.")
-except Exception as e:
-    print(f"Error recreating collection '{documentation_collection_name}': {e}")
-    exit(1) # Exit if collection recreation fails
 
-try:
-    qdrant_client_instance.recreate_collection(
-        collection_name=ddl_collection_name,
-        vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-    )
-    print(f"Collection '{ddl_collection_name}' recreated successfully with 384 dimensions.")
-except Exception as e:
-    print(f"Error recreating collection '{ddl_collection_name}': {e}")
-    exit(1) # Exit if collection recreation fails
+    print(f"Attempting to recreate Qdrant collections with 384 dimensions (default vector)...")
+    try:
+        qdrant_client_instance.recreate_collection(
+            collection_name=documentation_collection_name,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+        )
+        print(f"Collection '{documentation_collection_name}' recreated successfully with 384 dimensions.")
+    except Exception as e:
+        print(f"Error recreating collection '{documentation_collection_name}': {e}")
+        exit(1) # Exit if collection recreation fails
 
-try:
-    qdrant_client_instance.recreate_collection(
-        collection_name=sql_collection_name,
-        vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-    )
-    print(f"Collection '{sql_collection_name}' recreated successfully with 384 dimensions.")
-except Exception as e:
-    print(f"Error recreating collection '{sql_collection_name}': {e}")
-    exit(1) # Exit if collection recreation fails
+    try:
+        qdrant_client_instance.recreate_collection(
+            collection_name=ddl_collection_name,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+        )
+        print(f"Collection '{ddl_collection_name}' recreated successfully with 384 dimensions.")
+    except Exception as e:
+        print(f"Error recreating collection '{ddl_collection_name}': {e}")
+        exit(1) # Exit if collection recreation fails
+
+    try:
+        qdrant_client_instance.recreate_collection(
+            collection_name=sql_collection_name,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+        )
+        print(f"Collection '{sql_collection_name}' recreated successfully with 384 dimensions.")
+    except Exception as e:
+        print(f"Error recreating collection '{sql_collection_name}': {e}")
+        exit(1) # Exit if collection recreation fails
 
 # --- End add code to delete and recreate collection ---
 
 
-class MyVanna(Qdrant_VectorStore, OpenAI_Chat):
+class MyVanna(BulkTrainingMixin, Qdrant_VectorStore, OpenAI_Chat):
     def __init__(self, config=None):
         Qdrant_VectorStore.__init__(self, config={
             'client': config['client'],
@@ -289,7 +329,14 @@ else:
 # Proceed directly to training try block if connection was successful (indicated by no exit above)
 try:
     print("\nAttempting to fetch information schema and train...")
-    df_information_schema = vn.run_sql("SELECT * FROM INFORMATION_SCHEMA.COLUMNS")
+    # Only fetch the columns the training plan uses, for the schemas/tables our users actually query
+    information_schema_query = build_information_schema_query(
+        schemas=train_schemas,
+        include_tables=train_include_tables,
+        exclude_tables=train_exclude_tables,
+    )
+    print(f"Information schema query:\n{information_schema_query}")
+    df_information_schema = vn.run_sql(information_schema_query)
     print("Successfully fetched information schema.")
 
     # --- Debug print for information schema DataFrame ---
@@ -314,222 +361,25 @@ try:
         print("Training plan is empty.")
     print("-----------------------------")
 
-    # --- Explicitly add training data using specific methods (from plan) ---
-    print("\n--- Debug: Starting Explicit Training (from plan) ---")
-    if plan and plan._plan:
-        for item in plan._plan:
-            try:
-                if item.item_type == TrainingPlanItem.ITEM_TYPE_DDL:
-                    print(f"Adding DDL (from plan): {item.item_value[:50]}...")
-                    vn.add_ddl(item.item_value)
-                    print("DDL added from plan.")
-                elif item.item_type == TrainingPlanItem.ITEM_TYPE_IS:
-                    print(f"Adding Documentation (Schema): {item.item_value[:50]}...")
-                    vn.add_documentation(item.item_value)
-                    print("Documentation added.")
-                elif item.item_type == TrainingPlanItem.ITEM_TYPE_SQL:
-                     # Assuming SQL items in plan already have question and sql in item_name/item_value
-                    print(f"Adding SQL Example (from plan): Question='{item.item_name[:50]}...', SQL='{item.item_value[:50]}...'")
-                    vn.add_question_sql(question=item.item_name, sql=item.item_value)
-                    print("SQL example added from plan.")
-
-            except Exception as e:
-                print(f"Error adding training item (Type: {item.item_type if 'item' in locals() else 'unknown'}, Name: {item.item_name if 'item' in locals() else 'unknown'}): {e}") # Added safety for debug print
-                import traceback
-                traceback.print_exc()
-        print("--- Debug: Finished Explicit Training (from plan) ---")
-    else:
-        print("Skipping explicit training from plan because the plan is empty or invalid.")
-
-    # --- Add explicit DDL training for your specific tables ---
-    print("\n--- Debug: Starting Explicit DDL Training for User Tables ---")
-    try:
-        # Use the actual CREATE TABLE statement for your reviews table, which contains location_id
-        actual_reviews_ddl = """
-                           Table "public.reviews"
-    Column    |            Type             | Collation | Nullable | Default
---------------+-----------------------------+-----------+----------+---------
- comment_id   | integer                     |           | not null |
- tenant_id    | integer                     |           |          |
- location_id  | integer                     |           |          |
- comment      | text                        |           |          |
- created_date | timestamp without time zone |           |          |
-Indexes:
-    "reviews_pkey" PRIMARY KEY, btree (comment_id)
-        """
-        print("Adding actual DDL for 'reviews' table (containing location_id)...")
-        vn.add_ddl(actual_reviews_ddl)
-        print("Actual DDL for 'reviews' table added.")
-
-        # Remove the placeholder DDL for a separate locations table
-
-    except Exception as e:
-        print(f"Error during Explicit DDL Training: {e}")
-        import traceback
-        traceback.print_exc()
-    print("--- Debug: Finished Explicit DDL Training for User Tables ---")
-
-    # --- Add explicit Custom Documentation Training ---
-    print("\n--- Debug: Starting Explicit Custom Documentation Training ---")
-    try:
-        # Add your custom documentation strings here
-        vn.add_documentation("The reviews table contains customer feedback on locations.")
-        vn.add_documentation("Each location_id represents a unique physical location.")
-        vn.add_documentation("The tenant_id links reviews to specific tenants or businesses.")
-        vn.add_documentation("The comment column contains the text of the customer review.")
-        vn.add_documentation("The created_date indicates when the review was submitted.")
-
-        # Added documentation for requested clarifications
-        vn.add_documentation("A tenant in the system represents a company or business.")
-        vn.add_documentation("Each location is associated with and belongs to a specific tenant.")
-        vn.add_documentation("The data in the reviews table is structured such that each row represents a unique comment for a specific location and tenant.")
-        print("Custom documentation added.")
-    except Exception as e:
-        print(f"Error during Explicit Custom Documentation Training: {e}")
-        import traceback
-        traceback.print_exc()
-    print("--- Debug: Finished Explicit Custom Documentation Training ---")
-
-    # --- Add explicit DDL training for locations and comments tables ---
-    print("\n--- Debug: Starting Explicit DDL Training for Locations and Comments Tables ---")
-    try:
-        # DDL for locations table
-        locations_ddl = """
-        CREATE TABLE locations (
-            name TEXT,
-            tenant_id INTEGER,
-            location_id TEXT PRIMARY KEY,
-            location_type TEXT,
-            emails TEXT,
-            industry TEXT,
-            updated_date TIMESTAMP,
-            country TEXT,
-            street_address TEXT,
-            timezone TEXT,
-            postal_code TEXT,
-            locality TEXT,
-            street_address2 TEXT,
-            region TEXT
-        );
-        """
-        vn.add_ddl(locations_ddl)
-        vn.add_documentation("The locations table contains information about each business location, including address and tenant association.")
-
-        # DDL for comments table
-        comments_ddl = """
-        CREATE TABLE comments (
-            tenant_id INTEGER,
-            entity_id TEXT,
-            comment_id TEXT PRIMARY KEY,
-            text TEXT,
-            created_date TIMESTAMP,
-            location_updated_date TIMESTAMP,
-            overall_sentiment_score FLOAT,
-            text_language TEXT,
-            removed BOOLEAN
-        );
-        """
-        vn.add_ddl(comments_ddl)
-        vn.add_documentation("The comments table contains user reviews and metadata for each location or entity.")
-        print("DDL and documentation for locations and comments tables added.")
-    except Exception as e:
-        print(f"Error during Explicit DDL Training for Locations/Comments: {e}")
-        import traceback
-        traceback.print_exc()
-    print("--- Debug: Finished Explicit DDL Training for Locations and Comments Tables ---")
-
-    # --- Add explicit SQL Q&A training examples for join queries between comments and locations ---
-    print("\n--- Debug: Adding SQL Q&A Training Examples for Joins ---")
-    try:
-        # 1. How many comments are there for each location?
-        vn.add_question_sql(
-            question="How many comments are there for each location?",
-            sql="""
-                SELECT l.location_id, l.name, COUNT(c.comment_id) AS comment_count
-                FROM locations l
-                LEFT JOIN comments c ON l.location_id = c.entity_id
-                GROUP BY l.location_id, l.name
-                ORDER BY comment_count DESC;
-            """
-        )
-        # 2. What is the total number of comments for each tenant?
-        vn.add_question_sql(
-            question="What is the total number of comments for each tenant?",
-            sql="""
-                SELECT l.tenant_id, COUNT(c.comment_id) AS comment_count
-                FROM locations l
-                LEFT JOIN comments c ON l.location_id = c.entity_id
-                GROUP BY l.tenant_id
-                ORDER BY comment_count DESC;
-            """
-        )
-        # 3. How many locations have more than 10 comments?
-        vn.add_question_sql(
-            question="How many locations have more than 10 comments?",
-            sql="""
-                SELECT COUNT(*) AS locations_with_10plus_comments
-                FROM (
-                    SELECT l.location_id
-                    FROM locations l
-                    LEFT JOIN comments c ON l.location_id = c.entity_id
-                    GROUP BY l.location_id
-                    HAVING COUNT(c.comment_id) > 10
-                ) sub;
-            """
-        )
-        # 4. What is the average number of comments per location?
-        vn.add_question_sql(
-            question="What is the average number of comments per location?",
-            sql="""
-                SELECT AVG(comment_count) AS avg_comments_per_location
-                FROM (
-                    SELECT l.location_id, COUNT(c.comment_id) AS comment_count
-                    FROM locations l
-                    LEFT JOIN comments c ON l.location_id = c.entity_id
-                    GROUP BY l.location_id
-                ) sub;
-            """
-        )
-        print("SQL Q&A join training examples added.")
-    except Exception as e:
-        print(f"Error adding SQL Q&A join training examples: {e}")
-        import traceback
-        traceback.print_exc()
-    print("--- Debug: Finished Adding SQL Q&A Training Examples for Joins ---")
-
-    # --- Check points after explicit training (from plan and manual DDL) ---
-    # Remove the manual point checks that caused the AttributeError
-    # The script's default output will show the point counts.
-
-
-    # --- Uncomment the individual training examples if you want to add specific manual data ---
-    # DDL example (already added if in plan, but can add more manually)
-    # print("\nTraining with additional DDL example...")
-    # try:
-    #     vn.add_ddl(ddl="""CREATE TABLE other_table (id INT);""")
-    #     print("Additional DDL training complete.")
-    # except Exception as e:
-    #      print(f"Error during additional DDL training: {e}")
-
-    # Documentation example (already added if in plan, but can add more manually)
-    # print("\nTraining with additional documentation example...")
-    # try:
-    #     vn.add_documentation("The other_table stores temporary data.")
-    #     print("Additional Documentation training complete.")
-    # except Exception as e:
-    #      print(f"Error during additional documentation training: {e}")
-
-    # SQL example (uncomment and modify to add specific Q&A pairs)
-    print("\nTraining with SQL example...") # Uncomment this to add a specific Q&A pair
-    try:
-        sql_example = "SELECT COUNT(*) FROM reviews"
-        question_for_sql_example = "How many reviews are there?"
-        vn.add_question_sql(question=question_for_sql_example, sql=sql_example)
-        print("SQL example training complete.")
-    except Exception as e:
-         print(f"Error during SQL training: {e}")
-         import traceback
-         traceback.print_exc()
+    # --- Bulk training: embed in batches and write one upsert per batch ---
+    # In incremental mode only items whose fingerprint is not stored yet are embedded;
+    # in full mode the collections were recreated above, so everything is embedded.
+    # Batches from the DDL, documentation and SQL collections run concurrently; failed calls are retried
+    # with backoff, and a batch that keeps failing is retried item by item so one bad item never stalls the rest.
+    print(f"\n--- Debug: Starting Bulk Training (batch size {train_batch_size}, {train_workers} workers) ---")
+    training_summary = vn.train_bulk(
+        plan=plan,
+        # Hand-written training data for the user tables (see vanna_training_data.py)
+        ddl=MANUAL_DDL,
+        documentation=MANUAL_DOCUMENTATION,
+        question_sql=MANUAL_QUESTION_SQL,
+        batch_size=train_batch_size,
+        incremental=(train_mode == 'incremental'),
+        workers=train_workers,
+        retries=train_retries,
+    )
+    print(f"Training summary: {training_summary}")
+    print("--- Debug: Finished Bulk Training ---")
 
     # At any time you can inspect what training data the package is able to reference
     # ...
@@ -547,8 +397,11 @@ Indexes:
         # --- Debug print before vn.ask ---
         print("--- Debug: Calling vn.ask ---")
         # --- End debug print ---
-        # Keep allow_llm_to_see_data=True for the ask call in the script too
-        sql_query, results, fig = vn.ask(question=question, allow_llm_to_see_data=True, print_results=False) # Set print_results to False to control output here
+        # Keep allow_llm_to_see_data=True for the ask call in the script too.
+        # auto_train=False: the smoke test must not write its answer into vanna_sql, or the next incremental
+        # run would delete it as stale and every re-run would embed something.
+        sql_query, results, fig = vn.ask(question=question, allow_llm_to_see_data=True, print_results=False,
+                                         auto_train=False) # Set print_results to False to control output here
         # --- Debug print after vn.ask ---
         print("--- Debug: Returned from vn.ask ---")
         # --- End debug print ---
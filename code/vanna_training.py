@@ -0,0 +1,338 @@
+# code/vanna_training.py
+# Helpers for incremental, batched and concurrent training of the Qdrant-backed Vanna instance used by vanna_train.py.
+#
+# Qdrant_VectorStore stores every training item under a point id derived from its content
+# (vanna.utils.deterministic_uuid), so the point id doubles as the item's fingerprint:
+# an unchanged item keeps its id, an edited item gets a new one. Incremental training
+# therefore only has to diff the ids we want against the ids already stored.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from qdrant_client.http import models
+from vanna.types import TrainingPlan, TrainingPlanItem
+from vanna.utils import deterministic_uuid
+
+# Page size used when scrolling the existing point ids out of a collection
+SCROLL_PAGE_SIZE = 1000
+# Payload marker of points added through the API (e.g. pairs saved in the Flask UI). They have no source in
+# vanna_training_data.py, so incremental training leaves them alone instead of deleting them as stale.
+API_ADDED_PAYLOAD = {'added_by': 'api'}
+# Number of items embedded and upserted per batch by BulkTrainingMixin.train_bulk
+DEFAULT_BATCH_SIZE = 64
+# Number of batches embedded/upserted concurrently by BulkTrainingMixin.train_bulk
+DEFAULT_WORKERS = 4
+# Retries per embedding/Qdrant call, waiting DEFAULT_RETRY_BACKOFF * 2**attempt seconds in between
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 1.0
+
+# fastembed models are loaded lazily by the Qdrant client; make sure concurrent batches only load it once
+_embedding_model_lock = threading.Lock()
+
+
+def question_sql_text(question, sql):
+    # Same text Qdrant_VectorStore.add_question_sql embeds and hashes
+    return "Question: {0}\n\nSQL: {1}".format(question, sql)
+
+
+def collect_training_items(plan=None, ddl=None, documentation=None, question_sql=None):
+    """
+    Merge a TrainingPlan and the hand-written training lists into one de-duplicated set per item type.
+
+    Returns a dict with 'ddl', 'documentation' and 'sql' keys, each mapping the content fingerprint
+    (the point id Qdrant_VectorStore would use) to the item: a string for DDL and documentation,
+    a (question, sql) tuple for SQL examples.
+    """
+    items = {'ddl': {}, 'documentation': {}, 'sql': {}}
+
+    def add_ddl(value):
+        items['ddl'][deterministic_uuid(value)] = value
+
+    def add_documentation(value):
+        items['documentation'][deterministic_uuid(value)] = value
+
+    def add_question_sql(question, sql):
+        items['sql'][deterministic_uuid(question_sql_text(question, sql))] = (question, sql)
+
+    if plan is not None and plan._plan:
+        for item in plan._plan:
+            if item.item_type == TrainingPlanItem.ITEM_TYPE_DDL:
+                add_ddl(item.item_value)
+            elif item.item_type == TrainingPlanItem.ITEM_TYPE_IS:
+                add_documentation(item.item_value)
+            elif item.item_type == TrainingPlanItem.ITEM_TYPE_SQL:
+                add_question_sql(item.item_name, item.item_value)
+
+    for value in ddl or []:
+        add_ddl(value)
+    for value in documentation or []:
+        add_documentation(value)
+    for question, sql in question_sql or []:
+        add_question_sql(question, sql)
+
+    return items
+
+
+# information_schema.columns fields used by VannaBase.get_training_plan_generic
+INFORMATION_SCHEMA_COLUMNS = ['table_catalog', 'table_schema', 'table_name', 'column_name', 'data_type']
+
+# Bookkeeping tables of the loader (postgres_loader.py), the data-version tokens (data_version.py) and the
+# rollup maintenance (rollups.py). They live next to the data but are not something to answer questions
+# from, so they are always excluded from the training plan on top of VANNA_TRAIN_EXCLUDE_TABLES.
+INTERNAL_TABLES = ['load_progress', 'load_dropped_indexes', 'data_versions', 'comment_rollup_dirty_buckets']
+
+
+def parse_name_list(value):
+    # "public, sales" -> ['public', 'sales']; empty or unset -> []
+    if not value:
+        return []
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _sql_literal_array(values):
+    return "ARRAY[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]"
+
+
+def build_information_schema_query(schemas=('public',), include_tables=None, exclude_tables=None):
+    """
+    Build the information_schema.columns query used for the training plan.
+
+    Filtering happens server-side so system schemas (pg_catalog, information_schema) and unwanted
+    tables never reach get_training_plan_generic. `include_tables` / `exclude_tables` are SQL LIKE
+    patterns matched against the table name, e.g. ['comments', 'locations', 'rollup_%']. INTERNAL_TABLES
+    are always excluded.
+    """
+    if not schemas:
+        raise ValueError("At least one schema is required to build the training plan query.")
+
+    conditions = [f"table_schema = ANY({_sql_literal_array(schemas)})"]
+    if include_tables:
+        conditions.append(f"table_name LIKE ANY({_sql_literal_array(include_tables)})")
+    exclude_tables = INTERNAL_TABLES + list(exclude_tables or [])
+    conditions.append(f"NOT (table_name LIKE ANY({_sql_literal_array(exclude_tables)}))")
+
+    return (
+        f"SELECT {', '.join(INFORMATION_SCHEMA_COLUMNS)}\n"
+        f"FROM information_schema.columns\n"
+        f"WHERE {' AND '.join(conditions)}\n"
+        f"ORDER BY table_schema, table_name, ordinal_position"
+    )
+
+
+def get_stored_point_ids(client, collection_name, include_api_added=False):
+    # Scroll ids only - no payloads or vectors - so this stays cheap on large collections. Points added
+    # through the API are skipped unless asked for, so training never counts them as stale.
+    api_added = [models.FieldCondition(key=key, match=models.MatchValue(value=value))
+                 for key, value in API_ADDED_PAYLOAD.items()]
+    point_ids = set()
+    next_offset = None
+    while True:
+        records, next_offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=None if include_api_added else models.Filter(must_not=api_added),
+            limit=SCROLL_PAGE_SIZE,
+            offset=next_offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        point_ids.update(str(record.id) for record in records)
+        if next_offset is None:
+            return point_ids
+
+
+def ensure_collection(client, collection_name, vector_size, distance):
+    # Incremental mode keeps existing collections, so only create the ones that are missing
+    if not client.collection_exists(collection_name=collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(size=vector_size, distance=distance),
+        )
+        print(f"Collection '{collection_name}' created with {vector_size} dimensions.")
+
+
+def with_retry(call, retries=DEFAULT_RETRIES, backoff=DEFAULT_RETRY_BACKOFF):
+    """
+    Run `call()`, retrying up to `retries` times with exponential backoff.
+
+    ValueError/TypeError/KeyError point at bad input rather than a transient embedding or Qdrant
+    failure, so they are raised straight away.
+    """
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except (ValueError, TypeError, KeyError):
+            raise
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            attempt += 1
+            print(f"Transient error ({e}); retry {attempt}/{retries} in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class BulkTrainingMixin:
+    """
+    Batched training for Qdrant_VectorStore based Vanna classes.
+
+    Mix in ahead of Qdrant_VectorStore, e.g. `class MyVanna(BulkTrainingMixin, Qdrant_VectorStore, OpenAI_Chat)`.
+    Points are written with the same ids and payloads as add_ddl / add_documentation / add_question_sql,
+    so bulk-trained and individually-trained items are interchangeable.
+    """
+
+    def generate_embeddings(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        # Embed a list of texts in one pass through the fastembed model used by generate_embedding
+        with _embedding_model_lock:
+            embedding_model = self._client._get_or_init_model(model_name=self.fastembed_model)
+        return [embedding.tolist() for embedding in embedding_model.embed(list(texts), batch_size=batch_size)]
+
+    def get_training_plan_generic(self, df):
+        # VannaBase renders each table's columns with DataFrame.to_markdown(), row index included, so with one
+        # frame for all tables a column added to an earlier table would renumber (and re-fingerprint) every table
+        # after it. Build the plan table by table instead, with each table's rows numbered from 0.
+        plan = TrainingPlan([])
+        for _, df_table in df.groupby(INFORMATION_SCHEMA_COLUMNS[:3], sort=False):
+            plan._plan.extend(super().get_training_plan_generic(df_table.reset_index(drop=True))._plan)
+        return plan
+
+    def _training_collections(self):
+        # item type -> (collection name, text to embed, payload stored with the point)
+        return {
+            'ddl': (
+                self.ddl_collection_name,
+                lambda value: value,
+                lambda value: {"ddl": value},
+            ),
+            'documentation': (
+                self.documentation_collection_name,
+                lambda value: value,
+                lambda value: {"documentation": value},
+            ),
+            'sql': (
+                self.sql_collection_name,
+                lambda value: question_sql_text(value[0], value[1]),
+                lambda value: {"question": value[0], "sql": value[1]},
+            ),
+        }
+
+    def _upsert_batch(self, collection_name, point_ids, values, to_text, to_payload, batch_size):
+        vectors = self.generate_embeddings([to_text(value) for value in values], batch_size=batch_size)
+        self._client.upsert(
+            collection_name=collection_name,
+            points=[
+                models.PointStruct(id=point_id, vector=vector, payload=to_payload(value))
+                for point_id, vector, value in zip(point_ids, vectors, values)
+            ],
+        )
+
+    def _train_batch(self, item_type, collection_name, point_ids, values, to_text, to_payload,
+                     batch_size, retries, retry_backoff):
+        # Returns (added, failed). A batch that still fails after retrying is retried item by item,
+        # so one bad item only loses itself instead of its whole batch. The batch already went through the full
+        # backoff, so each item gets a single attempt: an outage then costs one quick failure per item rather
+        # than `retries` backoff sleeps per item.
+        try:
+            with_retry(lambda: self._upsert_batch(collection_name, point_ids, values, to_text, to_payload, batch_size),
+                       retries=retries, backoff=retry_backoff)
+            return len(point_ids), 0
+        except Exception as e:
+            if len(point_ids) == 1:
+                print(f"Error adding {item_type} item {point_ids[0]} to '{collection_name}': {e}")
+                return 0, 1
+            print(f"Error upserting batch of {len(point_ids)} {item_type} items into '{collection_name}': {e}. "
+                  f"Retrying item by item.")
+
+        added = 0
+        failed = 0
+        for point_id, value in zip(point_ids, values):
+            try:
+                self._upsert_batch(collection_name, [point_id], [value], to_text, to_payload, 1)
+                added += 1
+            except Exception as e:
+                failed += 1
+                print(f"Error adding {item_type} item {point_id} to '{collection_name}': {e}")
+        return added, failed
+
+    def train_bulk(self, plan=None, ddl=None, documentation=None, question_sql=None,
+                   batch_size=DEFAULT_BATCH_SIZE, incremental=True, workers=DEFAULT_WORKERS,
+                   retries=DEFAULT_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF):
+        """
+        Train on a whole TrainingPlan plus hand-written DDL, documentation and (question, sql) lists.
+
+        Items are embedded `batch_size` at a time and each batch is written with a single upsert.
+        Batches from all three collections run concurrently on a pool of `workers` threads, and each
+        embedding/upsert call is retried up to `retries` times with exponential backoff.
+        With `incremental=True` only items whose fingerprint is not stored yet are embedded, and stored
+        points whose fingerprint is no longer in the source are deleted, except points added through the API.
+        Returns per-type counts of added, removed, unchanged and failed items plus overall throughput.
+        """
+        started = time.perf_counter()
+        items = collect_training_items(plan=plan, ddl=ddl, documentation=documentation, question_sql=question_sql)
+        collections = self._training_collections()
+
+        summary = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batch_futures = {}
+            delete_futures = {}
+            for item_type, (collection_name, to_text, to_payload) in collections.items():
+                wanted = items[item_type]
+                stored = get_stored_point_ids(self._client, collection_name) if incremental else set()
+
+                to_add = [point_id for point_id in wanted if point_id not in stored]
+                to_remove = [point_id for point_id in stored if point_id not in wanted]
+                summary[item_type] = {
+                    'added': 0,
+                    'removed': 0,
+                    'unchanged': len(wanted) - len(to_add),
+                    'failed': 0,
+                }
+
+                for point_ids in _chunks(to_add, batch_size):
+                    future = executor.submit(
+                        self._train_batch, item_type, collection_name, point_ids,
+                        [wanted[point_id] for point_id in point_ids], to_text, to_payload,
+                        batch_size, retries, retry_backoff,
+                    )
+                    batch_futures[future] = item_type
+
+                if to_remove:
+                    future = executor.submit(
+                        with_retry,
+                        lambda collection_name=collection_name, to_remove=to_remove: self._client.delete(
+                            collection_name=collection_name,
+                            points_selector=models.PointIdsList(points=to_remove),
+                        ),
+                        retries=retries,
+                        backoff=retry_backoff,
+                    )
+                    delete_futures[future] = (item_type, collection_name, len(to_remove))
+
+            for future in as_completed(batch_futures):
+                added, failed = future.result()
+                summary[batch_futures[future]]['added'] += added
+                summary[batch_futures[future]]['failed'] += failed
+
+            for future in as_completed(delete_futures):
+                item_type, collection_name, removed = delete_futures[future]
+                try:
+                    future.result()
+                    summary[item_type]['removed'] = removed
+                except Exception as e:
+                    print(f"Error deleting {removed} stale {item_type} items from '{collection_name}': {e}")
+
+        elapsed = time.perf_counter() - started
+        processed = sum(counts['added'] + counts['failed'] for counts in summary.values())
+        for item_type, (collection_name, _, _) in collections.items():
+            print(f"Collection '{collection_name}': {summary[item_type]}")
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['items_per_second'] = round(processed / elapsed, 2) if elapsed > 0 else 0.0
+        print(f"Embedded {processed} items in {elapsed:.2f}s ({summary['items_per_second']} items/s) "
+              f"with {workers} workers.")
+
+        return summary
@@ -0,0 +1,178 @@
+# code/vanna_training_data.py
+# Hand-written training data for the user tables: DDL, documentation and example question/SQL pairs.
+#
+# Kept in its own module so vanna_train.py and benchmark_vanna.py train on the same items.
+# Incremental training fingerprints these strings exactly, so any edit (including whitespace)
+# re-embeds the edited item and removes the old one on the next run.
+from db_schema import INDEX_DDL
+from rollups import ROLLUP_DDL
+
+# Use the actual CREATE TABLE statement for your reviews table, which contains location_id
+actual_reviews_ddl = """
+                           Table "public.reviews"
+    Column    |            Type             | Collation | Nullable | Default
+--------------+-----------------------------+-----------+----------+---------
+ comment_id   | integer                     |           | not null |
+ tenant_id    | integer                     |           |          |
+ location_id  | integer                     |           |          |
+ comment      | text                        |           |          |
+ created_date | timestamp without time zone |           |          |
+Indexes:
+    "reviews_pkey" PRIMARY KEY, btree (comment_id)
+        """
+
+# DDL for locations table
+locations_ddl = """
+        CREATE TABLE locations (
+            name TEXT,
+            tenant_id INTEGER,
+            location_id TEXT PRIMARY KEY,
+            location_type TEXT,
+            emails TEXT,
+            industry TEXT,
+            updated_date TIMESTAMP,
+            country TEXT,
+            street_address TEXT,
+            timezone TEXT,
+            postal_code TEXT,
+            locality TEXT,
+            street_address2 TEXT,
+            region TEXT
+        );
+        """
+
+# DDL for comments table
+comments_ddl = """
+        CREATE TABLE comments (
+            tenant_id INTEGER,
+            entity_id TEXT,
+            comment_id TEXT PRIMARY KEY,
+            text TEXT,
+            created_date TIMESTAMP,
+            location_updated_date TIMESTAMP,
+            overall_sentiment_score FLOAT,
+            text_language TEXT,
+            removed BOOLEAN
+        );
+        """
+
+# Secondary indexes (db_schema.py, created by schema_setup.py) and the comment rollup table and views
+# (rollups.py), refreshed after every comments load
+MANUAL_DDL = [actual_reviews_ddl, locations_ddl, comments_ddl] + INDEX_DDL + ROLLUP_DDL
+
+MANUAL_DOCUMENTATION = [
+    "The reviews table contains customer feedback on locations.",
+    "Each location_id represents a unique physical location.",
+    "The tenant_id links reviews to specific tenants or businesses.",
+    "The comment column contains the text of the customer review.",
+    "The created_date indicates when the review was submitted.",
+    # Added documentation for requested clarifications
+    "A tenant in the system represents a company or business.",
+    "Each location is associated with and belongs to a specific tenant.",
+    "The data in the reviews table is structured such that each row represents a unique comment for a specific location and tenant.",
+    "The locations table contains information about each business location, including address and tenant association.",
+    "The comments table contains user reviews and metadata for each location or entity.",
+    # Rollups: steer count and sentiment questions away from scanning comments
+    "comment_monthly_rollup has one row per tenant_id, entity_id (the location_id) and month with comment_count, "
+    "removed_count and avg_sentiment of the comments created in that month. Use it instead of the comments table "
+    "for comment counts, monthly trends and average sentiment; it is refreshed after every load.",
+    "location_comment_rollup gives each location's total comment_count, removed_count and avg_sentiment, and "
+    "tenant_comment_rollup each tenant's totals and locations_with_comments. Locations without comments have no "
+    "row, so LEFT JOIN them from locations and use COALESCE(comment_count, 0).",
+    "Only query the comments table directly for questions about comment text, language or individual comments.",
+    "The rollups only count comments that have a tenant_id, entity_id and created_date, and tenant_comment_rollup "
+    "groups by comments.tenant_id. For comment totals per tenant of the locations table, join "
+    "location_comment_rollup to locations and group by locations.tenant_id.",
+    # Physical layout: write filters the indexes can use
+    "comments is indexed on (entity_id, created_date), so joins with locations on location_id = entity_id and "
+    "per-location date filters use an index; comments.tenant_id and locations.tenant_id are indexed too.",
+    "comments.created_date has a BRIN index. Filter dates with ranges on the bare column, e.g. "
+    "created_date >= '2024-01-01' AND created_date < '2024-02-01', not with functions of it such as "
+    "date_trunc or EXTRACT in the WHERE clause, so the index can skip the other months.",
+]
+
+# SQL Q&A training examples, including join queries between comments and locations
+MANUAL_QUESTION_SQL = [
+    # 1. How many comments are there for each location?
+    (
+        "How many comments are there for each location?",
+        """
+                SELECT l.location_id, l.name, COALESCE(r.comment_count, 0) AS comment_count
+                FROM locations l
+                LEFT JOIN location_comment_rollup r ON l.location_id = r.location_id
+                ORDER BY comment_count DESC;
+            """
+    ),
+    # 2. What is the total number of comments for each tenant?
+    (
+        "What is the total number of comments for each tenant?",
+        """
+                SELECT l.tenant_id, COALESCE(SUM(r.comment_count), 0) AS comment_count
+                FROM locations l
+                LEFT JOIN location_comment_rollup r ON l.location_id = r.location_id
+                GROUP BY l.tenant_id
+                ORDER BY comment_count DESC;
+            """
+    ),
+    # 3. How many locations have more than 10 comments?
+    (
+        "How many locations have more than 10 comments?",
+        """
+                SELECT COUNT(*) AS locations_with_10plus_comments
+                FROM locations l
+                JOIN location_comment_rollup r ON l.location_id = r.location_id
+                WHERE r.comment_count > 10;
+            """
+    ),
+    # 4. What is the average number of comments per location?
+    (
+        "What is the average number of comments per location?",
+        """
+                SELECT AVG(COALESCE(r.comment_count, 0)) AS avg_comments_per_location
+                FROM locations l
+                LEFT JOIN location_comment_rollup r ON l.location_id = r.location_id;
+            """
+    ),
+    # 5. Month-over-month increase per tenant
+    (
+        "For each tenant, which location had the largest increase in comments between two consecutive months?",
+        """
+                WITH monthly AS (
+                    SELECT tenant_id, entity_id AS location_id, month, comment_count,
+                           LAG(month) OVER (PARTITION BY tenant_id, entity_id ORDER BY month) AS previous_month,
+                           LAG(comment_count) OVER (PARTITION BY tenant_id, entity_id ORDER BY month) AS previous_count
+                    FROM comment_monthly_rollup
+                ),
+                increases AS (
+                    SELECT tenant_id, location_id, previous_month, month, comment_count - previous_count AS increase,
+                           ROW_NUMBER() OVER (PARTITION BY tenant_id ORDER BY comment_count - previous_count DESC) AS rn
+                    FROM monthly
+                    WHERE previous_month = month - INTERVAL '1 month'
+                )
+                SELECT tenant_id, location_id, previous_month, month, increase
+                FROM increases
+                WHERE rn = 1
+                ORDER BY tenant_id;
+            """
+    ),
+    # 6. Average sentiment per tenant
+    (
+        "What is the average sentiment score of each tenant's comments?",
+        """
+                SELECT tenant_id, avg_sentiment, comment_count
+                FROM tenant_comment_rollup
+                ORDER BY avg_sentiment DESC;
+            """
+    ),
+    # 7. Monthly comment volume
+    (
+        "How many comments were created each month?",
+        """
+                SELECT month, SUM(comment_count) AS comment_count
+                FROM comment_monthly_rollup
+                GROUP BY month
+                ORDER BY month;
+            """
+    ),
+    ("How many reviews are there?", "SELECT COUNT(*) FROM reviews"),
+]